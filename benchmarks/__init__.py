@@ -0,0 +1,5 @@
+"""
+Benchmarks for scratchattach's cloud features. They run against a LocalCloudServer in a separate process, so the measured CPU time only contains the work done by scratchattach.
+
+Run them with: python -m benchmarks --output results.json
+"""
@@ -0,0 +1,110 @@
+"""
+Command line interface of the benchmarks.
+
+Usage:
+    python -m benchmarks [--output results.json] [--only set_var,events,cloud_requests,parsing,dispatch] [--compare old_results.json] [--tolerance 0.2]
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+
+from . import cloud_requests, dispatch, events, parsing, set_var
+from .server import ServerProcess
+
+BENCHMARKS = {
+    "set_var": lambda server: {
+        "unlimited": set_var.run(server, ratelimit=0),
+        "turbowarp_ratelimit": set_var.run(server, ratelimit=0.005),
+        "scratch_ratelimit": set_var.run(server, ratelimit=0.1),
+        "set_vars_unlimited": set_var.run_batched(server, ratelimit=0),
+    },
+    "events": events.run,
+    "cloud_requests": cloud_requests.run,
+    "parsing": parsing.run,
+    "dispatch": dispatch.run,
+}
+
+# metrics where a higher value is better, every other compared metric is better when it's lower
+HIGHER_IS_BETTER = {"sets_per_second"}
+COMPARED_METRICS = {"microseconds_per_event", "unsubscribed_microseconds_per_event", "microseconds_per_packet", "sets_per_second", "cpu_seconds_per_set", "cpu_utilization", "p50", "p99", "cpu_seconds_per_message", "cpu_seconds_per_request", "lost"}
+
+
+def _flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)):
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(old, new, *, tolerance):
+    """
+    Compares two result files.
+
+    Returns:
+        list: Descriptions of the metrics that got worse by more than ``tolerance`` (relative)
+    """
+    old_flat = _flatten(old["results"])
+    regressions = []
+    for key, value in _flatten(new["results"]).items():
+        metric = key.rsplit(".", 1)[-1]
+        if metric not in COMPARED_METRICS or key not in old_flat:
+            continue
+        before = old_flat[key]
+        if metric in HIGHER_IS_BETTER:
+            worse = value < before * (1 - tolerance)
+        else:
+            worse = value > before * (1 + tolerance) and value - before > 1e-6
+        if worse:
+            regressions.append(f"{key}: {before:.6g} -> {value:.6g}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmarks for scratchattach's cloud features")
+    parser.add_argument("--output", help="File the results are written to (JSON). If not provided, they are printed.")
+    parser.add_argument("--only", help="Comma-separated names of the benchmarks that should be run: " + ", ".join(BENCHMARKS))
+    parser.add_argument("--compare", help="Result file of an earlier run. Regressions are listed and make the exit code 1.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Relative change that counts as regression (default: 0.2)")
+    args = parser.parse_args(argv)
+
+    names = list(BENCHMARKS) if args.only is None else args.only.split(",")
+    results = {}
+    with ServerProcess() as server:
+        for name in names:
+            print(f"Running benchmark '{name}' ...", file=sys.stderr)
+            results[name] = BENCHMARKS[name](server)
+        server_stats = server.stats()
+
+    report = {
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "server": server_stats,
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            old = json.load(f)
+        regressions = compare(old, report, tolerance=args.tolerance)
+        for regression in regressions:
+            print("Regression: " + regression, file=sys.stderr)
+        if regressions != []:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""Round-trip time of cloud requests handled by TwCloudRequests"""
+
+import json
+import threading
+import time
+
+from scratchattach import cloud
+from scratchattach.cloud_requests import TwCloudRequests
+from scratchattach.encoder import Encoding
+
+from .stats import summarize
+
+PACKET_LENGTH = 245 # Scratch's packet length, so responses are split like they are on Scratch
+BURST = 5 # number of requests sent at the same time in the burst case
+
+
+class _Project:
+    # Plays the part of the Scratch project: sends requests and collects the responses
+    def __init__(self, server, project_id):
+        self.connection = cloud.TwCloudConnection(project_id=project_id, cloud_host=server.url, contact="benchmark", _ratelimit=0)
+        self._responses = {}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._receive, daemon=True)
+        self._thread.start()
+
+    def _receive(self):
+        while True:
+            try:
+                message = self.connection.websocket.recv()
+            except Exception:
+                return
+            for line in message.split("\n"):
+                try:
+                    packet = json.loads(line)
+                except Exception:
+                    continue
+                if packet.get("method") == "set" and packet["name"].startswith("☁ FROM_HOST_"):
+                    value = str(packet["value"])
+                    with self._lock:
+                        for request_id, waiter in self._responses.items():
+                            if value.endswith("." + request_id + "2222"):
+                                waiter.set()
+
+    def request(self, request_id, request, *, timeout=30):
+        return self.request_many({request_id: request}, timeout=timeout)
+
+    def request_many(self, requests, *, timeout=30):
+        # sends all requests at once, returns the time until the last response arrived (None if a response is missing)
+        waiters = {request_id: threading.Event() for request_id in requests}
+        with self._lock:
+            self._responses.update(waiters)
+        start = time.perf_counter()
+        for request_id, request in requests.items():
+            self.connection.set_var("TO_HOST", Encoding.encode(request) + "." + request_id)
+        received = all(waiter.wait(max(0, start + timeout - time.perf_counter())) for waiter in waiters.values())
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            for request_id in waiters:
+                self._responses.pop(request_id)
+        return elapsed if received else None
+
+
+def run(server, *, repeat=5):
+    """
+    Measures the round-trip time of requests with a small response, a response that fills one packet and a response that has to be split into multiple packets, and the time until all responses of a burst of multi-part requests arrived.
+    """
+    host_connection = cloud.TwCloudConnection(project_id="benchmark-requests", cloud_host=server.url, contact="benchmark")
+    client = TwCloudRequests(host_connection, _packet_length=PACKET_LENGTH)
+
+    @client.request
+    def respond(size):
+        return "a" * int(size)
+
+    client.run(thread=True, daemon=True)
+    project = _Project(server, "benchmark-requests")
+    time.sleep(0.5) # lets the request handler connect
+
+    cases = {
+        "small": 5,
+        "max_packet_length": PACKET_LENGTH // 2, # every character is encoded as two digits
+        "multi_part": PACKET_LENGTH * 2,
+    }
+    results = {}
+    request_number = 0
+    for case, size in cases.items():
+        times = []
+        cpu_start = time.process_time()
+        for i in range(repeat):
+            request_number += 1
+            elapsed = project.request(f"{1000 + request_number}1", f"respond&{size}") # request ids ending with 0 are reserved for numeric responses
+            if elapsed is not None:
+                times.append(elapsed * 1000)
+        result = summarize(times)
+        result["unit"] = "ms"
+        result["response_length"] = size * 2
+        result["lost"] = repeat - len(times)
+        result["cpu_seconds_per_request"] = (time.process_time() - cpu_start) / repeat
+        results[case] = result
+
+    times = []
+    cpu_start = time.process_time()
+    for i in range(repeat):
+        burst = {}
+        for j in range(BURST):
+            request_number += 1
+            burst[f"{1000 + request_number}1"] = f"respond&{PACKET_LENGTH * 2}"
+        elapsed = project.request_many(burst)
+        if elapsed is not None:
+            times.append(elapsed * 1000)
+    result = summarize(times)
+    result["unit"] = "ms"
+    result["requests"] = BURST
+    result["lost"] = repeat - len(times)
+    result["cpu_seconds_per_request"] = (time.process_time() - cpu_start) / (repeat * BURST)
+    results["burst"] = result
+
+    client.stop()
+    project.connection.disconnect()
+    host_connection.disconnect()
+    return results
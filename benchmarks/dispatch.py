@@ -0,0 +1,94 @@
+"""Building cloud Event objects and calling the cloud events (no server needed)"""
+
+import json
+import sys
+import time
+
+from scratchattach import cloud
+
+
+class _DictEvent:
+    # the Event class used before the slotted one
+    def __init__(self, **entries):
+        self.__dict__.update(entries)
+
+
+def _old_dispatch(events, activities):
+    # the dispatch code the clouddata log handler used before the verb -> event table
+    for activity in activities:
+        if "on_"+activity["verb"][:-4] in events:
+            events["on_"+activity["verb"][:-4]](_DictEvent(user=activity["user"], var=activity["name"][2:], name=activity["name"][2:], value=activity["value"], timestamp=activity["timestamp"]))
+
+
+def _new_dispatch(handler, activities):
+    # the same loop as CloudEvents._update
+    for activity in activities:
+        event = handler._get_handler(activity["verb"][:-4], activity["name"])
+        if event is not None:
+            event(handler.Event(activity["user"], activity["name"][2:], activity["value"], activity["timestamp"]))
+
+
+def _time(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def run(server=None, *, count=50000, repeat=5):
+    """
+    Compares the old and the new way of building Event objects and calling the cloud events, for clouddata log entries and for websocket messages.
+    """
+    activities = [{"user": "user", "verb": "set_var", "name": "☁ value", "value": str(1000 + i), "timestamp": 1700000000000 + i} for i in range(count)]
+    received = []
+
+    def on_set(event):
+        received.append(event.value)
+
+    handler = cloud.WsCloudEvents("0", None)
+    handler.event(on_set)
+    old_log = _time(lambda: _old_dispatch({"on_set": on_set}, activities), repeat)
+    received.clear()
+    new_log = _time(lambda: _new_dispatch(handler, activities), repeat)
+
+    messages = [json.dumps({"method": "set", "name": "☁ value", "value": str(1000 + i)}) for i in range(count)]
+
+    def handle_messages():
+        for message in messages:
+            handler._handle_message(message)
+    new_ws = _time(handle_messages, repeat)
+
+    # a handler that is only subscribed to TO_HOST gets the same messages, which are all about other variables
+    filtered = cloud.WsCloudEvents("0", None)
+    filtered.event(on_set, variables="TO_HOST")
+
+    def handle_filtered_messages():
+        for message in messages:
+            filtered._handle_message(message)
+    filtered_ws = _time(handle_filtered_messages, repeat)
+
+    return {
+        "log_entries": {
+            "old_microseconds_per_event": old_log / count * 1e6,
+            "microseconds_per_event": new_log / count * 1e6,
+        },
+        "websocket_messages": {
+            "microseconds_per_event": new_ws / count * 1e6,
+            "unsubscribed_microseconds_per_event": filtered_ws / count * 1e6,
+        },
+        "event_size_bytes": {
+            "old": _size(_DictEvent(user="user", var="value", name="value", value="1000", timestamp=0)),
+            "new": _size(cloud.CloudEvents.Event("user", "value", "1000", 0)),
+        },
+    }
+
+
+def _size(obj):
+    size = sys.getsizeof(obj)
+    if hasattr(obj, "__dict__"):
+        size += sys.getsizeof(obj.__dict__)
+    return size
@@ -0,0 +1,55 @@
+"""End-to-end latency of cloud events received through TwCloudEvents / WsCloudEvents"""
+
+import threading
+import time
+
+from scratchattach import cloud
+
+from .stats import summarize
+
+
+def _measure(server, events, project_id, *, messages, interval):
+    latencies = []
+    done = threading.Event()
+
+    @events.event
+    def on_set(event):
+        if event.var == "sent_at":
+            latencies.append((time.perf_counter_ns() - int(event.value)) / 1e6)
+            if len(latencies) >= messages:
+                done.set()
+
+    events.start(thread=True)
+    sender = cloud.TwCloudConnection(project_id=project_id, cloud_host=server.url, contact="benchmark", _ratelimit=0)
+    time.sleep(0.2) # lets the event handler finish its handshake
+    cpu_start = time.process_time()
+    for i in range(messages):
+        sender.set_var("sent_at", time.perf_counter_ns())
+        time.sleep(interval)
+    done.wait(timeout=10)
+    cpu = time.process_time() - cpu_start
+    events.pause()
+    sender.set_var("wake_up", 2) # the event handler's thread exits once it receives another message
+    events._thread.join()
+    sender.disconnect()
+    result = summarize(latencies)
+    result["unit"] = "ms"
+    result["lost"] = messages - len(latencies)
+    result["cpu_seconds_per_message"] = cpu / messages # includes sending
+    return result
+
+
+def run(server, *, messages=500, interval=0.002):
+    """
+    Sends ``messages`` sets (one every ``interval`` seconds) and measures the time until each of them is handled by a cloud event.
+    """
+    tw_events = cloud.TwCloudEvents("benchmark-tw-events", cloud_host=server.url, contact="benchmark")
+    ws_connection = cloud.TwCloudConnection(project_id="benchmark-ws-events", cloud_host=server.url, contact="benchmark")
+    ws_events = cloud.WsCloudEvents("benchmark-ws-events", ws_connection)
+    results = {
+        "TwCloudEvents": _measure(server, tw_events, "benchmark-tw-events", messages=messages, interval=interval),
+        "WsCloudEvents": _measure(server, ws_events, "benchmark-ws-events", messages=messages, interval=interval),
+    }
+    tw_events.connection.disconnect()
+    ws_connection.disconnect()
+    return results
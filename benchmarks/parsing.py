@@ -0,0 +1,61 @@
+"""Parsing cloud websocket messages (no server needed)"""
+
+import json
+import time
+
+from scratchattach.framing import NDJSONFramer
+
+
+def _messages(count):
+    single = [json.dumps({"method": "set", "name": "☁ value", "value": str(1000 + i)}) for i in range(count)]
+    batched = ["\n".join(json.dumps({"method": "set", "name": f"☁ var{j}", "value": str(1000 + i)}) for j in range(8)) for i in range(count // 8)]
+    return single, batched
+
+
+def _split_and_load(messages):
+    # the parsing code the cloud event handlers used before NDJSONFramer
+    packets = 0
+    for message in messages:
+        for line in message.split("\n"):
+            try:
+                json.loads(line)
+                packets += 1
+            except Exception:
+                continue
+    return packets
+
+
+def _framer(messages):
+    framer = NDJSONFramer()
+    packets = 0
+    for message in messages:
+        packets += len(framer.feed(message))
+    return packets
+
+
+def _time(function, messages, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        packets = function(messages)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return {"packets": packets, "microseconds_per_packet": best / packets * 1e6}
+
+
+def run(server=None, *, count=20000, repeat=5):
+    """
+    Compares NDJSONFramer with splitting the messages and parsing each line with json.loads, for messages with one packet and with eight packets.
+    """
+    single, batched = _messages(count)
+    return {
+        "single_packet": {
+            "split_and_json_loads": _time(_split_and_load, single, repeat),
+            "framer": _time(_framer, single, repeat),
+        },
+        "eight_packets": {
+            "split_and_json_loads": _time(_split_and_load, batched, repeat),
+            "framer": _time(_framer, batched, repeat),
+        },
+    }
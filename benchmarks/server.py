@@ -0,0 +1,53 @@
+"""Runs a LocalCloudServer in a separate process"""
+
+import multiprocessing
+
+from scratchattach.cloud_server import LocalCloudServer
+
+
+def _serve(connection, options):
+    server = LocalCloudServer(**options)
+    server.start()
+    connection.send((server.url, server.log_url))
+    while True:
+        command = connection.recv()
+        if command == "stats":
+            connection.send(server.stats())
+        elif command == "stop":
+            server.stop()
+            connection.send(None)
+            return
+
+
+class ServerProcess:
+    """
+    Starts a LocalCloudServer in a child process. The keyword arguments are passed to LocalCloudServer.
+
+    Attributes:
+
+    :.url: The websocket URL of the server
+
+    :.log_url: The URL of the clouddata log API of the server
+    """
+
+    def __init__(self, **options):
+        self._connection, child_connection = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=_serve, args=(child_connection, options), daemon=True)
+        self._process.start()
+        self.url, self.log_url = self._connection.recv()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def stats(self):
+        self._connection.send("stats")
+        return self._connection.recv()
+
+    def stop(self):
+        if self._process.is_alive():
+            self._connection.send("stop")
+            self._connection.recv()
+            self._process.join()
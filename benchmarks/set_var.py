@@ -0,0 +1,57 @@
+"""Sustained set_var rate and CPU time per set"""
+
+import time
+
+from scratchattach import cloud
+
+
+def run(server, *, duration=2.0, ratelimit=0):
+    """
+    Sets a cloud variable as fast as the connection allows for ``duration`` seconds.
+
+    Keyword Arguments:
+        ratelimit (float): The rate limit interval of the connection. If the connection is rate-bound, "cpu_utilization" should be close to 0 (a busy-waiting rate limiter shows up as ~1).
+    """
+    conn = cloud.TwCloudConnection(project_id="benchmark-set-var", cloud_host=server.url, contact="benchmark", _ratelimit=ratelimit)
+    sets = 0
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    while time.perf_counter() - start < duration:
+        conn.set_var("value", sets + 2) # 0 and 1 are sent as booleans
+        sets += 1
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+    conn.disconnect()
+    return {
+        "ratelimit": ratelimit,
+        "sets": sets,
+        "seconds": elapsed,
+        "sets_per_second": sets / elapsed,
+        "cpu_seconds_per_set": cpu / sets,
+        "cpu_utilization": cpu / elapsed,
+    }
+
+
+def run_batched(server, *, duration=2.0, ratelimit=0, batch_size=9):
+    """
+    Like run(), but sets ``batch_size`` variables per call using set_vars.
+    """
+    conn = cloud.TwCloudConnection(project_id="benchmark-set-vars", cloud_host=server.url, contact="benchmark", _ratelimit=ratelimit)
+    sets = 0
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    while time.perf_counter() - start < duration:
+        conn.set_vars({f"value{i}": sets + 2 for i in range(batch_size)})
+        sets += batch_size
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+    conn.disconnect()
+    return {
+        "ratelimit": ratelimit,
+        "batch_size": batch_size,
+        "sets": sets,
+        "seconds": elapsed,
+        "sets_per_second": sets / elapsed,
+        "cpu_seconds_per_set": cpu / sets,
+        "cpu_utilization": cpu / elapsed,
+    }
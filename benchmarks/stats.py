@@ -0,0 +1,28 @@
+"""Helpers for summarizing measurements"""
+from scratchattach import keepalive
+
+
+def percentile(values, p):
+    """
+    Returns the p-th percentile (0-100) of a list of numbers, using the nearest-rank method.
+    """
+    if values == []:
+        return None
+    return keepalive.percentile(sorted(values), p)
+
+
+def summarize(values):
+    """
+    Returns:
+        dict: Count, mean, p50, p90, p99 and max of a list of numbers
+    """
+    if values == []:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p99": percentile(values, 99),
+        "max": max(values),
+    }
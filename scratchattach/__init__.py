@@ -4,6 +4,23 @@ from .session import *
 from .project import *
 from .studio import *
 from .cloud_requests import *
+from .async_cloud import *
+from .cloud_hub import *
+from .cloud_mirror import *
+from .cloud_server import *
+from .ratelimit import *
+from .reconnect import *
+from .keepalive import *
+from .failover import *
+from .framing import *
+from .cloud_dispatch import *
+from .cloud_subscriptions import *
+from .cloud_stream import *
+from .cloud_recorder import *
+from .cloud_pool import *
+from .cloud_backfill import *
+from .cloud_responses import *
+from .cloud_reassembly import *
 from .forum import *
 from .encoder import *
 
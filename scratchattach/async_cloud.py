@@ -0,0 +1,261 @@
+#----- Asyncio cloud interactions
+import asyncio
+import json
+import time
+from . import cloud
+from . import exceptions
+from .ratelimit import SendScheduler
+from .reconnect import ReconnectPolicy
+from .framing import NDJSONFramer
+
+try:
+    from websockets.asyncio.client import connect as _ws_connect
+except ImportError: # the websockets library is only needed for the asyncio cloud connections
+    _ws_connect = None
+
+class _AsyncCloudMixin:
+    """
+    Base class for an asyncio connection to a cloud variable server.
+
+    Unlike :class:`scratchattach.cloud.CloudConnection` and :class:`scratchattach.cloud.TwCloudConnection`, these connections don't need a thread each, so one event loop can drive many of them. The connection isn't opened on creation: Use ``await conn.connect()`` or ``async with conn:``.
+    """
+
+    _default_ratelimit = 0.1 # minimum time between two cloud variable sets (in seconds)
+
+    def __init__(self, *, project_id, username="scratchattach", session_id=None, cloud_host=None, purpose="", contact="", _allow_non_numeric=False, _ws_timeout=None, _ratelimit=None, reconnect_policy=None):
+        self._session_id = session_id
+        self._username = username
+        try:
+            self.project_id = int(project_id)
+        except ValueError: #non-numeric project id (possible on turbowarp's cloud server)
+            self.project_id = str(project_id)
+        self.scheduler = SendScheduler(self._default_ratelimit if _ratelimit is None else _ratelimit) #deals with the rate limit for cloud variable sets
+        self._connect_timestamp = 0 #timestamp of when the cloud connection was opened
+        self._ws_timeout = _ws_timeout
+        self._send_lock = None # created in connect() so it belongs to the running event loop
+        self._reconnect_lock = None
+        self._generation = 0 #increased every time the connection is re-opened, so tasks that noticed the same lost connection only reconnect once
+        self.reconnect_policy = ReconnectPolicy() if reconnect_policy is None else reconnect_policy
+
+        # user agent information (for connecting to TurboWarp's cloud servers)
+        self.purpose = purpose
+        self.contact = contact
+
+        self.websocket = None
+        self.cloud_host = cloud_host
+        self.allow_non_numeric = _allow_non_numeric #TurboWarp only. If this is true, turbowarp cloud variables can be set to non-numeric values (if the cloud_host wss allows it)
+
+        self.is_closed = True # set to False after await self.connect() and to True after await self.disconnect()
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.disconnect()
+
+    def __aiter__(self):
+        return self.events()
+
+    async def connect(self):
+        """
+        Opens the connection to the cloud server and performs the handshake.
+        """
+        if _ws_connect is None:
+            raise ImportError("The asyncio cloud connections require the websockets library. Install it using: pip install websockets")
+        if self._send_lock is None:
+            self._send_lock = asyncio.Lock()
+            self._reconnect_lock = asyncio.Lock()
+        await self._connect(cloud_host=self.cloud_host)
+        await self._handshake()
+        self.is_closed = False
+
+    async def reconnect(self):
+        """
+        Closes the current websocket (if it is still open), then connects and performs the handshake again. Failed attempts are retried as specified by the connection's reconnect policy (conn.reconnect_policy).
+
+        Raises:
+            scratchattach.exceptions.ConnectionError: The connection couldn't be re-opened
+        """
+        await self._reconnect(self._generation)
+
+    async def _reconnect(self, generation):
+        # re-opens the connection, unless another task already did that since `generation`
+        async with self._reconnect_lock:
+            if self._generation == generation:
+                await self.reconnect_policy.run_async(self._reopen)
+                self._generation += 1
+                self.is_closed = False
+
+    async def _reopen(self):
+        if self.websocket is not None:
+            try:
+                await self.websocket.close()
+            except Exception:
+                pass
+        await self._connect(cloud_host=self.cloud_host)
+        await self._handshake()
+
+    async def disconnect(self):
+        self.is_closed = True
+        if self.websocket is not None:
+            await self.websocket.close()
+
+    async def _send_packet(self, packet):
+        await self.websocket.send(json.dumps(packet) + "\n")
+
+    async def _handshake(self):
+        await self._send_packet(
+            {"method": "handshake", "user": self._username, "project_id": self.project_id}
+        )
+
+    def _check_value(self, value):
+        return cloud._check_scratch_value(value)
+
+    def _check_open(self):
+        if self.is_closed:
+            raise exceptions.ConnectionError("The connection isn't open. Use await conn.connect() or async with conn: first")
+
+    async def set_var(self, variable, value):
+        """
+        Sets a cloud variable. Waits (without blocking the event loop) until the rate limit allows sending the packet.
+
+        Args:
+            variable (str): The name of the cloud variable that should be set (provided without the cloud emoji)
+            value (str): The value the cloud variable should be set to
+
+        Raises:
+            scratchattach.exceptions.ConnectionError: The connection wasn't opened (or was closed with disconnect)
+        """
+        self._check_open()
+        variable = variable.replace("☁ ", "")
+        value = self._check_value(value)
+        packet = {
+            "method": "set",
+            "name": "☁ " + variable,
+            "value": value,
+            "user": self._username,
+            "project_id": self.project_id,
+        }
+        async with self._send_lock:
+            await self.scheduler.wait_async()
+            await self._send(json.dumps(packet) + "\n")
+
+    async def set_vars(self, variables):
+        """
+        Sets multiple cloud variables at once. All values are checked before anything is sent, then the set packets are sent together in one websocket message that only waits for the rate limit once.
+
+        Args:
+            variables (dict): Maps the names of the cloud variables (provided without the cloud emoji) to the values they should be set to
+
+        Raises:
+            scratchattach.exceptions.ConnectionError: The connection wasn't opened (or was closed with disconnect)
+        """
+        self._check_open()
+        checked = {}
+        for variable, value in variables.items():
+            checked[variable.replace("☁ ", "")] = self._check_value(value)
+        if checked == {}:
+            return
+        data = cloud._encode_set_packets(checked, self._username, self.project_id)
+        async with self._send_lock:
+            await self.scheduler.wait_async(len(checked))
+            await self._send(data)
+
+    async def _send(self, data):
+        # sends data over the websocket, reconnects and sends it again if the connection was lost
+        generation = self._generation
+        try:
+            await self.websocket.send(data)
+            return
+        except Exception:
+            pass
+        await self._reconnect(generation)
+        try:
+            await self.websocket.send(data)
+        except Exception as e:
+            raise exceptions.ConnectionError("Connection lost while setting cloud variables.", str(e))
+
+    async def events(self, *, reconnect=True):
+        """
+        Async generator that yields the cloud variable sets received from the cloud server.
+
+        Keyword Arguments:
+            reconnect (boolean): Whether the connection should be re-opened when it is lost. If this is False, the generator stops when the connection is lost.
+
+        Yields:
+            scratchattach.cloud.CloudEvents.Event: The received cloud event. The user attribute is always None because the cloud server doesn't provide it.
+        """
+        framer = NDJSONFramer()
+        while not self.is_closed:
+            generation = self._generation
+            try:
+                message = await self.websocket.recv()
+            except Exception:
+                if self.is_closed or not reconnect:
+                    return
+                await self._reconnect(generation)
+                framer.reset()
+                continue
+            for activity in framer.feed(message):
+                if activity.get("method") == "set":
+                    yield cloud.CloudEvents.Event(None, activity["name"][2:], activity["value"], time.time()*10000)
+
+class AsyncCloudConnection(_AsyncCloudMixin):
+    """
+    Represents an asyncio connection to Scratch's cloud variable server.
+
+    Attributes:
+
+    :.websocket: The websocket connection (ClientConnection object from the websockets library)
+    """
+
+    async def _connect(self, *, cloud_host):
+        for attempt in range(2):
+            try:
+                self.websocket = await _ws_connect(
+                    cloud_host or "wss://ws-scratch.synt2x.xyz",
+                    additional_headers={"Cookie": "scratchsessionsid=" + self._session_id + ";"},
+                    origin="https://scratch.synt2x.xyz",
+                    open_timeout=self._ws_timeout
+                )
+                break
+            except Exception:
+                if attempt == 1:
+                    raise(exceptions.ConnectionError)
+        self._connect_timestamp = time.time()
+
+class AsyncTwCloudConnection(_AsyncCloudMixin):
+    """
+    Represents an asyncio connection to TurboWarp's cloud variable server or a custom cloud variable server that behaves like TurboWarp's.
+
+    Attributes:
+
+    :.websocket: The websocket connection (ClientConnection object from the websockets library)
+
+    :.cloud_host: The websocket URL of the cloud variable server
+
+    :.allow_non_numeric: Whether the cloud variables can be set to non-numeric values
+    """
+
+    _default_ratelimit = 0.005
+
+    async def _connect(self, *, cloud_host=None):
+        if cloud_host is None:
+            cloud_host = "wss://clouddata.turbowarp.org/"
+            self.cloud_host = cloud_host
+        purpose_string = ""
+        if self.purpose != "" or self.contact != "":
+            purpose_string = f" (Purpose:{self.purpose}; Contact:{self.contact})"
+        try:
+            self.websocket = await _ws_connect(
+                cloud_host,
+                user_agent_header=f"scratchattach/1.6.6{purpose_string}" if self._ws_timeout is None else f"scratchattach/1.6.6 (short-term connection){purpose_string}",
+                open_timeout=self._ws_timeout
+            )
+        except Exception:
+            raise(exceptions.ConnectionError)
+        self._connect_timestamp = time.time()
+
+    def _check_value(self, value):
+        return cloud._check_tw_value(value, self.allow_non_numeric)
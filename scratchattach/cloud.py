@@ -2,55 +2,306 @@
 import websocket
 import json
 import requests
-from threading import Thread
+from threading import Thread, Lock
+from collections import deque, OrderedDict
 import time
 from . import exceptions
+from .ratelimit import SendScheduler, CoalescingQueue
+from .reconnect import ReconnectPolicy
+from .framing import NDJSONFramer
+from .cloud_subscriptions import SubscriptionRegistry, VariableFilter
+from .keepalive import Keepalive
+from .failover import HostPool
+from . import cloud_pool
 import traceback
 import warnings
 
+def _check_scratch_value(value):
+    """
+    Checks if a value can be set to a cloud variable on Scratch's cloud server. Returns the value in the form it should be sent.
+    """
+    if not (value in [True, False, float('inf'), -float('inf')]):
+        value = str(value)
+        if len(value) > 256:
+            warnings.warn("invalid cloud var (too long): "+str(value), Warning)
+            raise(exceptions.InvalidCloudValue)
+        x = value.replace(".", "")
+        x = x.replace("-", "")
+        if not (x.isnumeric() or x == ""):
+            warnings.warn("invalid cloud var (not numeric): "+str(value), Warning)
+            raise(exceptions.InvalidCloudValue)
+    return value
+
+def _check_tw_value(value, allow_non_numeric=False):
+    """
+    Checks if a value can be set to a cloud variable on TurboWarp's cloud server. Returns the value in the form it should be sent.
+    """
+    if not (value is True or value is False or value in [float('inf'), -float('inf')]):
+        value = str(value)
+        x = value.replace(".", "")
+        x = x.replace("-", "")
+        if not (x.isnumeric() or x == ""):
+            if allow_non_numeric is False:
+                raise(exceptions.InvalidCloudValue)
+    return value
+
+def _encode_set_packets(variables, username, project_id):
+    """
+    Builds the payload for a batch of set packets (one JSON object per line). The fields shared by all packets are only encoded once per batch.
+
+    Args:
+        variables (dict): Maps the cloud variable names (without the cloud emoji) to the already checked values
+    """
+    suffix = ', "user": ' + json.dumps(username) + ', "project_id": ' + json.dumps(project_id) + "}\n"
+    return "".join(
+        '{"method": "set", "name": ' + json.dumps("☁ " + variable) + ', "value": ' + json.dumps(value) + suffix
+        for variable, value in variables.items()
+    )
+
 class _CloudMixin:
     """
     Base class for a connection to a cloud variable server.
     """
 
-    def __init__(self, *, project_id, username="scratchattach", session_id=None, cloud_host=None, purpose="", contact="", _allow_non_numeric=False, _ws_timeout=None):
+    _default_ratelimit = 0.1 # minimum time between two cloud variable sets (in seconds)
+    _max_replay_values = 256 # maximum number of variables whose values are set again after failing over
+
+    def __init__(self, *, project_id, username="scratchattach", session_id=None, cloud_host=None, purpose="", contact="", _allow_non_numeric=False, _ws_timeout=None, _ratelimit=None, coalesce=False, reconnect_policy=None, keepalive=None, failover_replay=None):
         self._session_id = session_id
         self._username = username
         try:
             self.project_id = int(project_id)
         except ValueError: #non-numeric project id (possible on turbowarp's cloud server)
             self.project_id = str(project_id)
-        self._ratelimited_until = 0 #deals with the 0.1 second rate limit for cloud variable sets
+        self.scheduler = SendScheduler(self._default_ratelimit if _ratelimit is None else _ratelimit) #deals with the rate limit for cloud variable sets
+        self.outbox = CoalescingQueue(self.scheduler, self._set_var) if coalesce else None #if coalescing is enabled, set_var only queues the value and a background thread sends the latest value of each variable
         self._connect_timestamp = 0 #timestamp of when the cloud connection was opened
         self._ws_timeout = _ws_timeout
+        self._write_listeners = [] #called with a {variable: value} dict after cloud variables were set (used by CloudStateMirror)
+        self.reconnect_policy = ReconnectPolicy() if reconnect_policy is None else reconnect_policy
+        self._reconnect_lock = Lock()
+        self._generation = 0 #increased every time the connection is re-opened, so threads that noticed the same lost connection only reconnect once
+        self._pending = deque() #writes that failed because the connection was lost, they are sent again after reconnecting
+        self._readers = set() #the objects that currently read the websocket (cloud event handlers, CloudHubs). If there are none, the keepalive thread reads it
+        self._backlog = deque(maxlen=1000) #messages the keepalive thread received while nobody else read the websocket, they are returned by recv() first
+        self.keepalive = None
 
         # user agent information (for connecting to TurboWarp's cloud servers)
         self.purpose = purpose
         self.contact = contact
 
-        self.websocket = websocket.WebSocket()
-        self._connect(cloud_host=cloud_host)
-        self._handshake()
+        self.websocket = websocket.WebSocket(enable_multithread=True)
+        self.hosts = None #HostPool if several cloud servers were provided, the connection then fails over between them
+        if isinstance(cloud_host, HostPool):
+            self.hosts = cloud_host
+        elif isinstance(cloud_host, (list, tuple)):
+            self.hosts = HostPool(cloud_host)
+        if self.hosts is not None:
+            cloud_host = None #the host is chosen by the pool every time the connection is opened
+        self._replay_filter = None if failover_replay is None else VariableFilter(failover_replay) #the variables whose latest values are set again after failing over to another host
+        self._last_values = OrderedDict() #the latest values this connection set to these variables, least recently set first
         self.cloud_host = cloud_host
+        self._connect(cloud_host=cloud_host)
+        try:
+            self._handshake()
+        except Exception:
+            self.reconnect_policy.run(self._reopen)
         self.allow_non_numeric = _allow_non_numeric #TurboWarp only. If this is true, turbowarp cloud variables can be set to non-numeric values (if the cloud_host wss allows it)
 
         self.is_closed = False # set to True after self.disconnect() is called
+        if keepalive is not None:
+            self.start_keepalive(keepalive)
 
     def _send_packet(self, packet):
         self.websocket.send(json.dumps(packet) + "\n")
 
     def disconnect(self):
+        if self.keepalive is not None:
+            self.keepalive.stop()
+        if self.outbox is not None:
+            self.outbox.stop()
         self.is_closed = True
         self.websocket.close()
 
+    def start_keepalive(self, interval=10, *, timeout=None):
+        """
+        Starts sending websocket pings to the cloud server from a background thread (see :class:`scratchattach.keepalive.Keepalive`). This keeps the connection open while no cloud variables are set, and a connection that doesn't answer the pings anymore is re-opened before the next set fails. Use conn.keepalive.stats() to get the measured round-trip times.
+
+        This can also be done by creating the connection with the keepalive keyword argument (set to the interval).
+
+        Args:
+            interval (float): The time between two pings (in seconds)
+
+        Keyword Arguments:
+            timeout (float): How long to wait for the answer to a ping before the connection is considered dead. Defaults to half the interval.
+
+        Returns:
+            scratchattach.keepalive.Keepalive: The started keepalive (also available as conn.keepalive)
+        """
+        if self.keepalive is not None:
+            self.keepalive.stop()
+        self.keepalive = Keepalive(self, interval=interval, timeout=timeout)
+        self.keepalive.start()
+        return self.keepalive
+
+    def _on_frame(self, opcode, frame):
+        # handles a frame read from the websocket. Returns the message if it's a data frame, else None
+        if opcode == websocket.ABNF.OPCODE_TEXT:
+            return frame.data.decode("utf-8")
+        if opcode == websocket.ABNF.OPCODE_BINARY:
+            return frame.data
+        if opcode == websocket.ABNF.OPCODE_PONG:
+            if self.keepalive is not None:
+                self.keepalive._on_pong(frame.data)
+        elif opcode == websocket.ABNF.OPCODE_CLOSE:
+            raise exceptions.ConnectionError("The cloud server closed the connection")
+        return None
+
+    def recv(self):
+        """
+        Waits for the next message from the cloud server and returns it. Unlike conn.websocket.recv(), this passes the answers to the keepalive pings to conn.keepalive and also returns the messages the keepalive thread received while nobody read the connection.
+
+        Returns:
+            str: The received message (bytes if it was a binary message)
+        """
+        with self.websocket.readlock:
+            if len(self._backlog) > 0:
+                return self._backlog.popleft()
+            while True:
+                opcode, frame = self.websocket.recv_data_frame(True)
+                message = self._on_frame(opcode, frame)
+                if message is not None:
+                    return message
+
+    def _connect(self, *, cloud_host=None):
+        # opens the websocket connection. If several cloud servers were provided, they are tried in the order chosen by the HostPool
+        if self.hosts is None:
+            self._connect_to(cloud_host)
+            return
+        for host in self.hosts.ordered():
+            started = time.perf_counter()
+            try:
+                self._connect_to(host)
+            except exceptions.ConnectionError:
+                self.hosts.record_failure(host)
+                continue
+            self.hosts.record_success(host, time.perf_counter() - started)
+            self.cloud_host = host
+            return
+        raise exceptions.ConnectionError("None of the cloud servers could be connected to")
+
     def _handshake(self):
+        self._send_packet(
+            {"method": "handshake", "user": self._username, "project_id": self.project_id}
+        )
+
+    def _reopen(self):
+        previous_host = self.cloud_host
         try:
-            self._send_packet(
-                {"method": "handshake", "user": self._username, "project_id": self.project_id}
-            )
+            self.websocket.shutdown() # the old connection is dropped without closing handshake, it's usually dead anyway
         except Exception:
-            self._connect(cloud_host=self.cloud_host)
-            self._handshake()
+            pass
+        self._connect(cloud_host=self.cloud_host)
+        self._handshake()
+        if self.cloud_host != previous_host and self._last_values != {}:
+            # failed over to another host: it may not have received the latest sets of this connection
+            values = dict(self._last_values)
+            self.scheduler.wait(len(values))
+            self.websocket.send(_encode_set_packets(values, self._username, self.project_id))
+
+    def reconnect(self):
+        """
+        Re-opens the connection to the cloud server and performs the handshake again. Failed attempts are retried as specified by the connection's reconnect policy (conn.reconnect_policy).
+
+        Raises:
+            scratchattach.exceptions.ConnectionError: The connection couldn't be re-opened
+        """
+        self._reconnect(self._generation, lost=False)
+
+    def _reconnect(self, generation, data=None, *, blocking=True, lost=True):
+        # re-opens the connection (unless another thread already did that since `generation`), then sends the writes that failed in the meantime
+        with self._reconnect_lock:
+            if data is not None:
+                self._pending.append(data)
+            try:
+                while True:
+                    if self._generation == generation:
+                        if lost and self.hosts is not None:
+                            self.hosts.record_failure(self.cloud_host)
+                        if blocking:
+                            self.reconnect_policy.run(self._reopen)
+                        else:
+                            self.reconnect_policy.attempt(self._reopen)
+                        self._generation += 1
+                        self.is_closed = False
+                    generation = self._generation
+                    try:
+                        while len(self._pending) > 0:
+                            self.websocket.send(self._pending[0])
+                            self._pending.popleft()
+                        return
+                    except Exception as e:
+                        if not blocking:
+                            raise exceptions.ConnectionError("Connection lost while sending pending cloud variable sets.", str(e))
+            except exceptions.ConnectionError:
+                self._pending.clear()
+                raise
+
+    def _send(self, data):
+        # sends data over the websocket, reconnects and sends it again if the connection was lost
+        generation = self._generation
+        try:
+            self.websocket.send(data)
+        except Exception:
+            self._reconnect(generation, data)
+        self.is_closed = False
+
+    def _set_var(self, variable, value):
+        # sends the set packet, the caller has to wait for the rate limit first
+        self._send(
+            json.dumps({
+                "method": "set",
+                "name": "☁ " + variable,
+                "value": value,
+                "user": self._username,
+                "project_id": self.project_id,
+            }) + "\n"
+        )
+
+    def _notify_write(self, variables):
+        if self.hosts is not None and self._replay_filter is not None:
+            for variable, value in variables.items():
+                if self._replay_filter.matches(variable):
+                    self._last_values[variable] = value
+                    self._last_values.move_to_end(variable)
+            while len(self._last_values) > self._max_replay_values:
+                self._last_values.popitem(last=False)
+        for listener in self._write_listeners:
+            listener(variables)
+
+    def set_vars(self, variables):
+        """
+        Sets multiple cloud variables at once. All values are checked before anything is sent, so if one of them is invalid, none of the variables are set. The set packets are then sent together in one websocket message. The whole batch only waits for the rate limit once, the following sets wait longer instead, so the average rate stays within the rate limit.
+
+        If the connection was created with coalesce=True, the values are queued and this method returns immediately.
+
+        Args:
+            variables (dict): Maps the names of the cloud variables (provided without the cloud emoji) to the values they should be set to
+        """
+        checked = {}
+        for variable, value in variables.items():
+            checked[variable.replace("☁ ", "")] = self._check_value(value)
+        if checked == {}:
+            return
+        if self.outbox is not None:
+            for variable, value in checked.items():
+                self.outbox.put(variable, value)
+            self._notify_write(checked)
+            return
+        data = _encode_set_packets(checked, self._username, self.project_id)
+        self.scheduler.wait(len(checked))
+        self._send(data)
+        self._notify_write(checked)
 
     # ---
 
@@ -77,13 +328,25 @@ class CloudConnection(_CloudMixin):
     Attributes:
 
     :.websocket: The websocket connection (WebSocket object from the websocket-client library)
+
+    :.hosts: The HostPool that chooses the cloud server if a list of servers (or a HostPool) was provided as cloud_host, else None. The connection then connects to the healthiest server and fails over to another one when the connection is lost. The variables matching the failover_replay keyword argument (names or patterns like "state_*") are set to the latest values this connection set after failing over, no variables are set again by default
+
+    :.scheduler: The SendScheduler that enforces the rate limit. Use conn.scheduler.stats() to get queue depth and wait time statistics
+
+    :.outbox: The CoalescingQueue used if the connection was created with coalesce=True, else None
+
+    :.reconnect_policy: The ReconnectPolicy that decides when a lost connection is re-opened (backoff, max. attempts, circuit breaker). A custom policy can be passed with the reconnect_policy keyword argument
+
+    :.keepalive: The Keepalive that pings the cloud server (see conn.start_keepalive), else None
     """
 
-    def _connect(self, *, cloud_host):
+    def _connect_to(self, cloud_host):
+        if cloud_host is None:
+            cloud_host = "wss://ws-scratch.synt2x.xyz"
         try:
-            self.websocket = websocket.WebSocket()
+            self.websocket = websocket.WebSocket(enable_multithread=True)
             self.websocket.connect(
-                "wss://ws-scratch.synt2x.xyz",
+                cloud_host,
                 cookie="scratchsessionsid=" + self._session_id + ";",
                 origin="https://scratch.synt2x.xyz",
                 enable_multithread=True,
@@ -91,9 +354,9 @@ class CloudConnection(_CloudMixin):
             )
         except Exception:
             try:
-                self.websocket = websocket.WebSocket()
+                self.websocket = websocket.WebSocket(enable_multithread=True)
                 self.websocket.connect(
-                    "wss://ws-scratch.synt2x.xyz",
+                    cloud_host,
                     cookie="scratchsessionsid=" + self._session_id + ";",
                     origin="https://scratch.synt2x.xyz",
                     enable_multithread=True,
@@ -103,51 +366,25 @@ class CloudConnection(_CloudMixin):
                 raise(exceptions.ConnectionError)
         self._connect_timestamp = time.time()
 
+    def _check_value(self, value):
+        return _check_scratch_value(value)
+
     def set_var(self, variable, value):
         """
-        Sets a cloud variable.
+        Sets a cloud variable. If the connection was created with coalesce=True, the value is queued and this method returns immediately.
 
         Args:
             variable (str): The name of the cloud variable that should be set (provided without the cloud emoji)
             value (str): The value the cloud variable should be set to
         """
         variable = variable.replace("☁ ", "")
-        if not (value in [True, False, float('inf'), -float('inf')]):
-            value = str(value)
-            if len(value) > 256:
-                warnings.warn("invalid cloud var (too long): "+str(value), Warning)
-                raise(exceptions.InvalidCloudValue)
-            x = value.replace(".", "")
-            x = x.replace("-", "")
-            if not (x.isnumeric() or x == ""):
-                warnings.warn("invalid cloud var (not numeric): "+str(value), Warning)
-                raise(exceptions.InvalidCloudValue)
-        while self._ratelimited_until + 0.1 >= time.time():
-            pass
-        try:
-            self._send_packet(
-                {
-                    "method": "set",
-                    "name": "☁ " + variable,
-                    "value": value,
-                    "user": self._username,
-                    "project_id": self.project_id,
-                }
-            )
-        except Exception as e:
-            try:
-                self._handshake()
-            except Exception:
-                try:
-                    self._connect(cloud_host=self.cloud_host)
-                    self._handshake()
-                except Exception as e:
-                    raise exceptions.ConnectionError("Connection lost while setting cloud variable.", str(e))
-
-            time.sleep(0.1)
-            self.set_var(variable, value)
-        self.is_closed = False
-        self._ratelimited_until = time.time()
+        value = self._check_value(value)
+        if self.outbox is None:
+            self.scheduler.wait()
+            self._set_var(variable, value)
+        else:
+            self.outbox.put(variable, value)
+        self._notify_write({variable: value})
 
 class TwCloudConnection(_CloudMixin):
     """
@@ -157,12 +394,24 @@ class TwCloudConnection(_CloudMixin):
 
     :.websocket: The websocket connection (WebSocket object from the websocket-client library)
 
-    :.cloud_host: The websocket URL of the cloud variable server
+    :.cloud_host: The websocket URL of the cloud variable server (the one currently connected to if several were provided)
+
+    :.hosts: The HostPool that chooses the cloud server if a list of servers (or a HostPool) was provided as cloud_host, else None. The connection then connects to the healthiest server and fails over to another one when the connection is lost. The variables matching the failover_replay keyword argument (names or patterns like "state_*") are set to the latest values this connection set after failing over, no variables are set again by default. Use conn.hosts.stats() to get the health of the servers
     
     :.allow_non_numeric: Whether the cloud variables can be set to non-numeric values
+
+    :.scheduler: The SendScheduler that enforces the rate limit. Use conn.scheduler.stats() to get queue depth and wait time statistics
+
+    :.outbox: The CoalescingQueue used if the connection was created with coalesce=True, else None
+
+    :.reconnect_policy: The ReconnectPolicy that decides when a lost connection is re-opened (backoff, max. attempts, circuit breaker). A custom policy can be passed with the reconnect_policy keyword argument
+
+    :.keepalive: The Keepalive that pings the cloud server (see conn.start_keepalive), else None
     """
 
-    def _connect(self, *, cloud_host=None):
+    _default_ratelimit = 0.005
+
+    def _connect_to(self, cloud_host):
         try:
             if cloud_host is None:
                 cloud_host = "wss://clouddata.turbowarp.org/"
@@ -181,55 +430,33 @@ class TwCloudConnection(_CloudMixin):
         self.is_closed = False
         self._connect_timestamp = time.time()
 
+    def _check_value(self, value):
+        return _check_tw_value(value, self.allow_non_numeric)
 
     def set_var(self, variable, value):
         """
-        Sets a cloud variable.
+        Sets a cloud variable. If the connection was created with coalesce=True, the value is queued and this method returns immediately.
 
         Args:
             variable (str): The name of the cloud variable that should be set (provided without the cloud emoji)
             value (str): The value the cloud variable should be set to
         """
         variable = variable.replace("☁ ", "")
-        if not (value is True or value is False or value in [float('inf'), -float('inf')]):
-            value = str(value)
-            x = value.replace(".", "")
-            x = x.replace("-", "")
-            if not (x.isnumeric() or x == ""):
-                if self.allow_non_numeric is False:
-                    raise(exceptions.InvalidCloudValue)
-
-        while self._ratelimited_until + 0.005 > time.time():
-            pass
-        try:
-            self._send_packet(
-                {
-                    "method": "set",
-                    "name": "☁ " + variable,
-                    "value": value,
-                    "user": self._username,
-                    "project_id": self.project_id,
-                }
-            )
-        except Exception as e:
-            try:
-                self._handshake()
-                time.sleep(0.1)
-            except Exception:
-                try:
-                    self._connect(cloud_host=None)
-                    self._handshake()
-                except Exception as e:
-                    raise exceptions.ConnectionError("Connection lost while setting cloud variable.", str(e))
-
-            time.sleep(0.1)
-            self.set_var(variable, value)
-        self._ratelimited_until = time.time()
+        value = self._check_value(value)
+        if self.outbox is None:
+            self.scheduler.wait()
+            self._set_var(variable, value)
+        else:
+            self.outbox.put(variable, value)
+        self._notify_write({variable: value})
 
 
 class CloudEvents:
     """
     Class that calls events on Scratch cloud variable updates. Data fetched from Scratch's clouddata logs.
+
+    Keyword Arguments:
+        dispatcher: (optional) A ThreadPoolDispatcher or SerialDispatcher object that calls the events, so slow events don't delay receiving cloud activity. If this isn't provided, the events are called in the thread of the cloud event handler. The same keyword argument is accepted by TwCloudEvents and WsCloudEvents.
     """
     class Event:
         """
@@ -246,65 +473,223 @@ class CloudEvents:
         .timestamp: Then timestamp of when the action was performed
 
         .value: If the cloud variable was set, then this attribute provides the value the cloud variable was set to
+
+        .seq: The sequence number of the event if it was passed on by a MergedCloudEvents object, else None
         """
-        def __init__(self, **entries):
-            self.__dict__.update(entries)
+        __slots__ = ("user", "var", "value", "timestamp", "seq") # no per-instance dict, high-frequency projects create many of these objects
+
+        def __init__(self, user=None, var=None, value=None, timestamp=None, *, name=None, seq=None):
+            self.user = user
+            self.var = var if name is None else name
+            self.value = value
+            self.timestamp = timestamp
+            self.seq = seq
+
+        @property
+        def name(self):
+            return self.var
+
+        def __repr__(self):
+            return f"Event(user={self.user!r}, var={self.var!r}, value={self.value!r}, timestamp={self.timestamp!r})"
 
     def __init__(self, project_id, **entries):
         self.project_id = int(project_id)
-        self.data = get_cloud_logs(project_id=self.project_id, limit = 15)
         self._thread = None
+        self._hub = None
+        self._subscriptions = SubscriptionRegistry() #callbacks that get the raw packets received from the cloud websocket (used by CloudStateMirror)
+        self._framer = NDJSONFramer() #parses the messages received from the cloud websocket
         self.running = False
         self._events = {}
+        self._event_filters = {} #maps the names of events that are only called for some cloud variables to VariableFilter objects
+        self._handlers = {} #maps the verbs / methods and variable names of received activity to the event that handles them (None if there is no such event). Cleared when an event is added
+        self.dispatcher = None #if this is None, the events are called in the thread that receives the cloud activity
         self.cloud_log_limit = 15
+        self.max_cloud_log_limit = 100 #the limit is raised up to this value if more activity than cloud_log_limit happens between two checks
+        self.max_catch_up = 1000 #max. amount of log entries that are paged through to catch up after a gap
+        self.log_url = "https://scratch.synt2x.xyz/logs"
         self.__dict__.update(entries)
+        # the cursor marks the newest log entry that was already handled: its timestamp and the entries seen with exactly that timestamp
+        self._cursor_timestamp = 0
+        self._cursor_seen = set()
+        self._cursor_ready = False #set by the first successful fetch of the log. The entries that existed before aren't emitted
+        try:
+            self.data = _fetch_cloud_logs(self.project_id, limit = 15, offset = 0, log_url = self.log_url)
+        except exceptions.FetchError:
+            self.data = []
+        else:
+            self._advance_cursor(self.data)
+            self._cursor_ready = True
 
-    def start(self, *, update_interval = 0.1, thread=True):
+    def start(self, *, update_interval = 0.1, max_update_interval = 2, thread=True, daemon=False):
         """
         Starts the cloud event handler.
 
         Keyword Arguments:
             update_interval (float): The clouddata log is continuosly checked for cloud updates. This argument provides the interval between these checks.
+            max_update_interval (float): While no cloud activity happens, the interval between the checks is increased up to this value. It is reset to update_interval as soon as new activity is found.
             thread (boolean): Whether the event handler should be run in a thread.
+            daemon (boolean): Whether the thread should be a daemon thread, so it doesn't keep the program running
         """
         if self.running is False:
             self.update_interval = update_interval
+            self.max_update_interval = max(update_interval, max_update_interval)
             self.running = True
             if "on_ready" in self._events:
                 self._events["on_ready"]()
             if thread:
-                self._thread = Thread(target=self._update, args=())
+                self._thread = Thread(target=self._update, args=(), daemon=daemon)
                 self._thread.start()
             else:
                 self._thread = None
                 self._update()
 
-    def _update(self):
+    @staticmethod
+    def _log_key(activity):
+        return (activity["timestamp"], activity["user"], activity["verb"], activity["name"], activity["value"])
+
+    def _is_handled(self, activity):
+        if activity["timestamp"] != self._cursor_timestamp:
+            return activity["timestamp"] < self._cursor_timestamp
+        return self._log_key(activity) in self._cursor_seen
+
+    def _advance_cursor(self, activities):
+        for activity in activities:
+            if activity["timestamp"] > self._cursor_timestamp:
+                self._cursor_timestamp = activity["timestamp"]
+                self._cursor_seen = {self._log_key(activity)}
+            elif activity["timestamp"] == self._cursor_timestamp:
+                self._cursor_seen.add(self._log_key(activity))
+
+    def _poll(self):
+        """
+        Fetches the log entries that were added since the last check, oldest first. If all entries of the fetched page are new, there may be a gap: In this case, the following pages are fetched until already handled entries are reached (at most self.max_catch_up entries), and the limit is raised for the next checks.
+        """
+        new = []
+        new_keys = set()
+        offset = 0
+        limit = self.cloud_log_limit
         while True:
-            if self.running:
-                data = get_cloud_logs(project_id = self.project_id, limit = self.cloud_log_limit)
-                if data != self.data:
-                    for activity in data:
-                        if activity in self.data:
-                            break
-                        if "on_"+activity["verb"][:-4] in self._events:
-                            try:
-                                self._events["on_"+activity["verb"][:-4]](self.Event(user=activity["user"], var=activity["name"][2:], name=activity["name"][2:], value=activity["value"], timestamp=activity["timestamp"]))
-                            except Exception as e:
-                                print("Warning: Caught error in cloud event - Full error below")
-                                try:
-                                    traceback.print_exc()
-                                except Exception:
-                                    print(e)
-                self.data = data
+            try:
+                page = _fetch_cloud_logs(self.project_id, limit = limit, offset = offset, log_url = self.log_url)
+            except exceptions.FetchError:
+                break
+            if offset == 0:
+                self.data = page
+                if not self._cursor_ready:
+                    # the log couldn't be fetched when the event handler was created: the entries on this page are old activity
+                    self._advance_cursor(page)
+                    self._cursor_ready = True
+                    return []
+            reached_cursor = False
+            for activity in page:
+                if self._is_handled(activity):
+                    reached_cursor = True
+                    break
+                key = self._log_key(activity)
+                if key not in new_keys: # entries can appear twice if activity happens while paging
+                    new_keys.add(key)
+                    new.append(activity)
+            if reached_cursor or len(page) < limit or offset + limit >= self.max_catch_up:
+                break
+            offset += limit
+        if offset > 0:
+            self.cloud_log_limit = min(self.cloud_log_limit * 2, self.max_cloud_log_limit)
+        new.reverse()
+        self._advance_cursor(new)
+        return new
+
+    def _update(self):
+        interval = self.update_interval
+        while self.running:
+            activities = self._poll()
+            for activity in activities:
+                try:
+                    if len(self._subscriptions) > 0:
+                        for callback in self._subscriptions.match(activity["name"]):
+                            callback(activity)
+                    self._emit(activity["verb"][:-4], activity["name"], activity["user"], activity["value"], activity["timestamp"])
+                except Exception as e:
+                    print("Warning: Caught error in cloud event - Full error below")
+                    try:
+                        traceback.print_exc()
+                    except Exception:
+                        print(e)
+            # adaptive backoff: idle projects are checked less often
+            if activities == []:
+                interval = min(interval * 1.5, self.max_update_interval)
             else:
-                return
-            time.sleep(self.update_interval)
+                interval = self.update_interval
+            time.sleep(interval)
+
+    def _handle_message(self, message):
+        # calls the events for the packets contained in a message received from the cloud websocket. Errors are caught per packet, so an event that fails doesn't drop the other packets of the message
+        for activity in self._framer.feed(message):
+            try:
+                name = activity.get("name")
+                if len(self._subscriptions) > 0:
+                    for callback in self._subscriptions.match(name):
+                        callback(activity)
+                self._emit(activity["method"], name, None, activity.get("value"), time.time()*10000)
+            except Exception as e:
+                print("Warning: Caught error in cloud event - Full error below")
+                try:
+                    traceback.print_exc()
+                except Exception:
+                    print(e)
+
+    def _emit(self, action, raw_name, user, value, timestamp):
+        # calls the event for an action on a cloud variable (raw name with the cloud emoji). The Event object is only created if there is an event for the action and variable
+        handler = self._get_handler(action, raw_name)
+        if handler is None:
+            return
+        event = self.Event(user, raw_name[2:], value, timestamp)
+        if self.dispatcher is not None:
+            self.dispatcher.submit(event.var, handler, event)
+        else:
+            handler(event)
+
+    def _get_handler(self, action, raw_name):
+        # returns the event that handles an action ("set", "create", ...) on a cloud variable (raw name with the cloud emoji), the result is cached per action and variable
+        try:
+            return self._handlers[action][raw_name]
+        except KeyError:
+            pass
+        handler = self._events.get("on_"+action)
+        if handler is not None and raw_name is None:
+            handler = None
+        elif handler is not None and "on_"+action in self._event_filters:
+            if not self._event_filters["on_"+action].matches(raw_name[2:]):
+                handler = None
+        handlers = self._handlers.setdefault(action, {})
+        if len(handlers) >= 4096: # many different variable names (possible on TurboWarp)
+            handlers.clear()
+        handlers[raw_name] = handler
+        return handler
+
+    def _reconnect(self, generation=None, *, blocking=True):
+        # re-opens the websocket connection after reading from it failed. If blocking is False, only one attempt is made (used by CloudHub)
+        if generation is None:
+            generation = self.connection._generation
+        self._framer.reset()
+        try:
+            self.connection._reconnect(generation, blocking=blocking)
+        except exceptions.ConnectionError:
+            if "on_disconnect" in self._events:
+                self._events["on_disconnect"]()
+            if blocking:
+                # the circuit breaker of the reconnect policy is open, the next attempt is made after its cooldown
+                retry_at = time.time() + self.connection.reconnect_policy.next_delay()
+                while self.running and time.time() < retry_at:
+                    time.sleep(min(0.5, retry_at - time.time()))
 
     def stop(self):
         """
         Permanently stops the cloud event handler.
         """
+        if self._hub is not None:
+            self.running = False
+            self._hub.remove(self)
+            self._hub = None
         if self._thread is not None:
             self.running = False
             self.project_id = None
@@ -316,19 +701,57 @@ class CloudEvents:
         Pauses the cloud event handler.
         """
         self.running = False
+        if self._hub is not None:
+            self._hub.remove(self)
 
     def resume(self):
         """
         Resumes the cloud event handler.
         """
         if self.running is False:
-            self.start(update_interval=self.update_interval, thread=True)
+            if self._hub is not None:
+                self._hub.add(self)
+            else:
+                self.start(update_interval=self.update_interval, max_update_interval=self.max_update_interval, thread=True, daemon=self._thread is not None and self._thread.daemon)
 
-    def event(self, function):
+    def event(self, function=None, *, variables=None):
         """
         Decorator function. Adds a cloud event.
+
+        Keyword Arguments:
+            variables (str or list): (optional) Names and / or glob patterns (like "FROM_HOST_*") of the cloud variables the event is called for. If this isn't provided, the event is called for all cloud variables. Activity on other variables is skipped before an Event object is created for it.
+
+        Example::
+
+            @events.event(variables=["TO_HOST"])
+            def on_set(event):
+                ...
         """
+        if function is None:
+            return lambda function: self.event(function, variables=variables)
         self._events[function.__name__] = function
+        if variables is None:
+            self._event_filters.pop(function.__name__, None)
+        else:
+            self._event_filters[function.__name__] = VariableFilter(variables)
+        self._handlers = {}
+        return function
+
+    def subscribe(self, variables, callback):
+        """
+        Subscribes a callback to the raw packets (dicts) of some cloud variables. For websocket-based cloud event handlers, these are the received packets. For CloudEvents, these are the new clouddata log entries. The callback is called in the thread that receives the packets, before the events are called.
+
+        Args:
+            variables (str or list): Names and / or glob patterns of the cloud variables. "*" subscribes to all packets.
+            callback: Function that is called with the received packets
+        """
+        self._subscriptions.add(variables, callback)
+
+    def unsubscribe(self, callback):
+        """
+        Removes all subscriptions of a callback.
+        """
+        self._subscriptions.remove(callback)
 
 class TwCloudEvents(CloudEvents):
     """
@@ -341,32 +764,41 @@ class TwCloudEvents(CloudEvents):
         if not "contact" in entries:
             self.contact = ""
             print("Warning: You connected to TurboWarp's cloud without giving the `contact` argument.\nTurboWarp would like to you to identify yourself by providing a way you can be contacted (like your Scratch account for example): TwCloudEvents('project_id', contact='your_contact_info')\nThis is optional at the moment, but it helps TurboWarp to understand who is using their cloud service.")
-        cloud_connection = TwCloudConnection(project_id=project_id, purpose=self.purpose, contact=self.contact)
+        cloud_connection = TwCloudConnection(project_id=project_id, purpose=self.purpose, contact=self.contact, cloud_host=entries.get("cloud_host"))
         self.data = []
         self._thread = None
+        self._hub = None
+        self._subscriptions = SubscriptionRegistry() #callbacks that get the raw packets received from the cloud websocket (used by CloudStateMirror)
+        self._framer = NDJSONFramer() #parses the messages received from the cloud websocket
         self.running = False
         self._events = {}
+        self._event_filters = {}
+        self._handlers = {} #maps the methods and variable names of received packets to the event that handles them (None if there is no such event)
+        self.dispatcher = entries.get("dispatcher")
         self.connection = cloud_connection
 
     def _update(self):
-        while True:
-            try:
-                data = self.connection.websocket.recv().split('\n')
-                result = []
-                for i in data:
-                    try:
-                        result.append(json.loads(i))
-                    except Exception: pass
-                for activity in result:
-                    if "on_"+activity["method"] in self._events:
-                        self._events["on_"+activity["method"]](self.Event(user=None, var=activity["name"][2:], name=activity["name"][2:], value=activity["value"], timestamp=time.time()*10000))
-            except Exception:
+        self.connection._readers.add(self)
+        try:
+            while self.running:
+                generation = self.connection._generation
                 try:
-                    self.connection._connect(cloud_host=self.connection.cloud_host)
-                    self.connection._handshake()
+                    message = self.connection.recv()
                 except Exception:
-                    if "on_disconnect" in self._events:
-                        self._events["on_disconnect"]()
+                    if self.running:
+                        self._reconnect(generation)
+                    continue
+                self._handle_message(message)
+        finally:
+            self.connection._readers.discard(self)
+
+    def stop(self):
+        """
+        Permanently stops the cloud event handler and closes its connection to TurboWarp's cloud server.
+        """
+        self.running = False
+        self.connection.disconnect()
+        super().stop()
 
 class WsCloudEvents(CloudEvents):
     """
@@ -375,54 +807,49 @@ class WsCloudEvents(CloudEvents):
     def __init__(self, project_id, connection, **entries):
         self.data = []
         self._thread = None
+        self._hub = None
+        self._subscriptions = SubscriptionRegistry() #callbacks that get the raw packets received from the cloud websocket (used by CloudStateMirror)
+        self._framer = NDJSONFramer() #parses the messages received from the cloud websocket
         self.running = False
         self._events = {}
+        self._event_filters = {}
+        self._handlers = {} #maps the methods and variable names of received packets to the event that handles them (None if there is no such event)
+        self.dispatcher = None
         self.connection = connection
         self.__dict__.update(entries)
 
     def _update(self):
-        if isinstance(self.connection, CloudConnection):
-            log_data = get_cloud(project_id = self.connection.project_id)
-        else:
-            log_data = {}
-        while True:
-            try:
-                data = self.connection.websocket.recv().split('\n')
-                result = []
-                for i in data:
-                    try:
-                        result.append(json.loads(i))
-                    except Exception:
-                        pass
-                for activity in result:
-                    if "on_"+activity["method"] in self._events:
-                        self._events["on_"+activity["method"]](self.Event(user=None, var=activity["name"][2:], name=activity["name"][2:], value=activity["value"], timestamp=time.time()*10000))
-            except Exception:
+        self.connection._readers.add(self)
+        try:
+            while self.running:
+                generation = self.connection._generation
                 try:
-                    self.connection._connect(cloud_host=self.connection.cloud_host)
-                    self.connection._handshake()
-                    if isinstance(self.connection, CloudConnection):
-                        log_data = get_cloud(project_id = self.connection.project_id)
-                    else:
-                        log_data = {}
+                    message = self.connection.recv()
                 except Exception:
-                    if "on_disconnect" in self._events:
-                        self._events["on_disconnect"]()
+                    if self.running:
+                        self._reconnect(generation)
+                    continue
+                self._handle_message(message)
+        finally:
+            self.connection._readers.discard(self)
 # -----
 
 
-def get_cloud(project_id):
+def get_cloud(project_id, *, log_url="https://scratch.synt2x.xyz/logs"):
     """
     Gets the clouddata of a Scratch cloud project.
 
     Args:
         project_id (str):
+
+    Keyword Arguments:
+        log_url (str): The URL of the clouddata log API. Only set this argument if you know what you are doing.
     
     Returns:
         dict: The values of the project's cloud variables
     """
     try:
-        response = json.loads(requests.get(f"https://scratch.synt2x.xyz/logs?projectid={project_id}&limit=100&offset=0").text)
+        response = json.loads(requests.get(f"{log_url}?projectid={project_id}&limit=100&offset=0").text)
         response.reverse()
         clouddata = {}
         for activity in response:
@@ -431,13 +858,16 @@ def get_cloud(project_id):
     except Exception:
         return []
 
-def get_var(project_id, variable):
+def get_var(project_id, variable, *, log_url="https://scratch.synt2x.xyz/logs"):
     """
     Gets the value of of a Scratch cloud variable.
     
     Args:
         project_id (str):
         variable (str): The name of the cloud variable (specified without the cloud emoji)
+
+    Keyword Arguments:
+        log_url (str): The URL of the clouddata log API. Only set this argument if you know what you are doing.
     
     Returns:
         str: The cloud variable's value
@@ -445,7 +875,7 @@ def get_var(project_id, variable):
     If the value can't be fetched, the method returns None.
     """
     try:
-        response = json.loads(requests.get(f"https://scratch.synt2x.xyz/logs?projectid={project_id}&limit=100&offset=0").text)
+        response = json.loads(requests.get(f"{log_url}?projectid={project_id}&limit=100&offset=0").text)
         response = list(filter(lambda k: k["name"] == "☁ "+variable, response))
         if response == []:
             return None
@@ -454,12 +884,11 @@ def get_var(project_id, variable):
     except Exception:
         return None
 
-def get_tw_cloud(project_id, *, purpose="", contact=""):
+def get_tw_cloud(project_id, *, purpose="", contact="", pooled=True):
     """
     Gets the clouddata of a TurboWarp cloud project.
 
-    Warning:
-        Do not spam this method, it creates a new connection to the TurboWarp cloud server every time it is called.
+    The connection opened for the first lookup of a project is kept open in a process-wide pool (see :class:`scratchattach.cloud_pool.TwCloudPool`), following lookups of the project are answered from the values received over it.
 
     Args:
         project_id (str):
@@ -467,33 +896,30 @@ def get_tw_cloud(project_id, *, purpose="", contact=""):
     Keyword Arguments:
         purpose (str): (optional) Provide information about what you're using TurboWarp's cloud server for
         contact (str): (optional) Provide an email address or another way you can be contacted
+        pooled (boolean): If this is False, a new connection is opened (and closed again) for the lookup. Do not spam the method with this setting.
 
     Returns:
         dict: The values of the project's cloud variables
     """
 
+    if pooled:
+        try:
+            return cloud_pool.get_tw_cloud_pool().get_cloud(project_id, purpose=purpose, contact=contact)
+        except Exception:
+            raise exceptions.FetchError
     try:
         conn = TwCloudConnection(project_id=project_id, _ws_timeout=1, purpose=purpose, contact=contact)
-        data = conn.websocket.recv().split("\n")
+        result = NDJSONFramer().feed(conn.recv())
         conn.disconnect()
-
-        result = []
-        for i in data:
-            try:
-                result.append(json.loads(i))
-            except Exception: pass
         return result
     except websocket._exceptions.WebSocketTimeoutException:
         return []
     except Exception:
         raise exceptions.FetchError
 
-def get_tw_var(project_id, variable, *, purpose="", contact=""):
+def get_tw_var(project_id, variable, *, purpose="", contact="", pooled=True):
     """
-    Gets the value of of a TurboWarp cloud variable.
-
-    Warning:
-        Do not spam this method, it creates a new connection to the TurboWarp cloud server every time it is called.
+    Gets the value of of a TurboWarp cloud variable. Like :func:`get_tw_cloud`, this reuses pooled connections.
 
     Args:
         project_id (str):
@@ -502,6 +928,7 @@ def get_tw_var(project_id, variable, *, purpose="", contact=""):
     Keyword Arguments:
         purpose (str): (optional) Provide information about what you're using TurboWarp's cloud server for
         contact (str): (optional) Provide an email address or another way you can be contacted
+        pooled (boolean): If this is False, a new connection is opened (and closed again) for the lookup
 
     Returns:
         str: The cloud variable's value
@@ -510,7 +937,7 @@ def get_tw_var(project_id, variable, *, purpose="", contact=""):
     """
     try:
         variable = "☁ " + str(variable)
-        result = get_tw_cloud(project_id, purpose=purpose, contact=contact)
+        result = get_tw_cloud(project_id, purpose=purpose, contact=contact, pooled=pooled)
         if result == []:
             return None
         else:
@@ -522,7 +949,17 @@ def get_tw_var(project_id, variable, *, purpose="", contact=""):
     except Exception as e:
         raise exceptions.FetchError
 
-def get_cloud_logs(project_id, *, filter_by_var_named =None, limit=25, offset=0):
+def _fetch_cloud_logs(project_id, *, limit, offset, log_url):
+    # like get_cloud_logs, but raises FetchError if the log couldn't be fetched instead of returning an empty list
+    try:
+        response = json.loads(requests.get(f"{log_url}?projectid={project_id}&limit={limit}&offset={offset}").text)
+    except Exception:
+        raise exceptions.FetchError
+    if not isinstance(response, list):
+        raise exceptions.FetchError
+    return response
+
+def get_cloud_logs(project_id, *, filter_by_var_named =None, limit=25, offset=0, log_url="https://scratch.synt2x.xyz/logs"):
     """
     Gets Scratch's clouddata log for a project.
     
@@ -536,7 +973,7 @@ def get_cloud_logs(project_id, *, filter_by_var_named =None, limit=25, offset=0)
         log_url (str): If you want to get the clouddata from a cloud log API different to Scratch's normal cloud log API, set this argument to the URL of the API. Only set this argument if you know what you are doing. If you want to get the clouddata from the normal API, don't put this argument.
     """
     try:
-        response = json.loads(requests.get(f"https://scratch.synt2x.xyz/logs?projectid={project_id}&limit={limit}&offset={offset}").text)
+        response = _fetch_cloud_logs(project_id, limit=limit, offset=offset, log_url=log_url)
         if filter_by_var_named is None: return response
         else:
             return list(filter(lambda k: k["name"] == "☁ "+filter_by_var_named, response))
@@ -0,0 +1,180 @@
+#----- Crawling the complete clouddata log of a project
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from . import exceptions
+
+def _log_key(activity):
+    return (activity["timestamp"], activity["user"], activity["verb"], activity["name"], activity["value"])
+
+class CloudLogCrawler:
+    """
+    Pages through the clouddata log of a project, fetching several pages at the same time. The log entries are yielded newest first, like the clouddata log API returns them.
+
+    Activity that happens during the crawl shifts the entries to higher offsets, so the same entries can be returned on two pages. The crawler remembers the oldest yielded timestamp and the entries yielded with it, and skips entries it has already yielded.
+
+    If a checkpoint file is provided, the progress is saved to it after every page and when the crawl is stopped, and a new crawler created with the same file continues where the last one stopped.
+
+    Args:
+        project_id:
+
+    Keyword Arguments:
+        page_size (int): The number of log entries fetched with one request
+        workers (int): Maximum number of pages that are fetched at the same time
+        checkpoint (str): (optional) Path of the file the progress is saved to
+        since (int): (optional) Timestamp (in milliseconds). The crawl ends when older entries are reached.
+        retries (int): How often the fetch of a page is retried before the crawl fails
+        log_url (str): The URL of the clouddata log API. Only set this argument if you know what you are doing.
+
+    Attributes:
+
+    :.pages: The number of fetched pages
+
+    :.entries: The number of yielded log entries
+
+    :.duplicates: The number of entries that were skipped because they were already yielded
+
+    :.complete: Whether the crawl reached the end of the log (or the since timestamp)
+
+    Example::
+
+        crawler = scratchattach.CloudLogCrawler("project_id", checkpoint="crawl.json")
+        for activity in crawler.crawl():
+            print(activity["user"], activity["name"], activity["value"])
+    """
+
+    def __init__(self, project_id, *, page_size=100, workers=4, checkpoint=None, since=None, retries=3, log_url="https://scratch.synt2x.xyz/logs"):
+        self.project_id = project_id
+        self.page_size = page_size
+        self.workers = workers
+        self.checkpoint = checkpoint
+        self.since = since
+        self.retries = retries
+        self.log_url = log_url
+        self.pages = 0
+        self.entries = 0
+        self.duplicates = 0
+        self.complete = False
+        # where the crawl continues: the offset of the next page, the oldest yielded timestamp and the keys of the entries yielded with exactly that timestamp
+        self._offset = 0
+        self._anchor_timestamp = None
+        self._anchor_seen = set()
+        if checkpoint is not None and os.path.exists(checkpoint):
+            self._load_checkpoint()
+
+    def _load_checkpoint(self):
+        with open(self.checkpoint, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if str(data["project_id"]) != str(self.project_id):
+            raise ValueError(f"The checkpoint file belongs to the crawl of project {data['project_id']}")
+        self._offset = data["offset"]
+        self._anchor_timestamp = data["timestamp"]
+        self._anchor_seen = set(tuple(key) for key in data["seen"])
+        self.entries = data["entries"]
+        self.complete = data["complete"]
+
+    def _save_checkpoint(self):
+        if self.checkpoint is None:
+            return
+        data = {
+            "project_id": self.project_id,
+            "offset": self._offset,
+            "timestamp": self._anchor_timestamp,
+            "seen": list(self._anchor_seen),
+            "entries": self.entries,
+            "complete": self.complete,
+        }
+        temporary = self.checkpoint + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(temporary, self.checkpoint) # the checkpoint file is never left half-written
+
+    def _fetch(self, offset):
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                time.sleep(0.5 * 2 ** (attempt - 1))
+            try:
+                page = json.loads(requests.get(f"{self.log_url}?projectid={self.project_id}&limit={self.page_size}&offset={offset}", timeout=10).text)
+            except Exception:
+                continue
+            if isinstance(page, list):
+                return page
+        raise exceptions.FetchError(f"Couldn't fetch the clouddata log page at offset {offset}")
+
+    def _is_yielded(self, activity):
+        if self._anchor_timestamp is None:
+            return False
+        if activity["timestamp"] != self._anchor_timestamp:
+            return activity["timestamp"] > self._anchor_timestamp
+        return _log_key(activity) in self._anchor_seen
+
+    def _advance_anchor(self, activity):
+        if activity["timestamp"] != self._anchor_timestamp:
+            self._anchor_timestamp = activity["timestamp"]
+            self._anchor_seen = set()
+        self._anchor_seen.add(_log_key(activity))
+
+    def crawl(self):
+        """
+        Generator that fetches the log pages and yields the log entries that weren't yielded before (by this crawler or by an earlier crawler with the same checkpoint file).
+
+        Raises:
+            scratchattach.exceptions.FetchError: A page couldn't be fetched. The progress up to this page is saved to the checkpoint file.
+
+        Yields:
+            dict: The log entries, newest first
+        """
+        if self.complete:
+            return
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        in_flight = deque() # (offset, future) pairs of the pages that are fetched, in order
+        next_offset = self._offset
+        reached_end = False
+        try:
+            while True:
+                while not reached_end and len(in_flight) < self.workers:
+                    in_flight.append((next_offset, executor.submit(self._fetch, next_offset)))
+                    next_offset += self.page_size
+                if len(in_flight) == 0:
+                    break
+                offset, future = in_flight.popleft()
+                page = future.result()
+                self.pages += 1
+                if len(page) < self.page_size:
+                    # the last page of the log: the pages that are fetched after it are empty
+                    reached_end = True
+                    for later_offset, later_future in in_flight:
+                        later_future.cancel()
+                    in_flight.clear()
+                for activity in page:
+                    if self.since is not None and activity["timestamp"] < self.since:
+                        reached_end = True
+                        for later_offset, later_future in in_flight:
+                            later_future.cancel()
+                        in_flight.clear()
+                        break
+                    if self._is_yielded(activity):
+                        self.duplicates += 1
+                        continue
+                    self._advance_anchor(activity)
+                    self.entries += 1
+                    yield activity
+                self._offset = offset + self.page_size
+                self._save_checkpoint()
+            self.complete = True
+        finally:
+            # also runs when the generator is closed early: the next crawl starts at the page that was being yielded, the entries that were already yielded are skipped
+            for later_offset, later_future in in_flight:
+                later_future.cancel()
+            executor.shutdown(wait=False)
+            self._save_checkpoint()
+
+    def stats(self):
+        """
+        Returns:
+            dict: The numbers of fetched pages, yielded entries and skipped duplicates, and whether the crawl is complete
+        """
+        return {"pages": self.pages, "entries": self.entries, "duplicates": self.duplicates, "complete": self.complete}
@@ -0,0 +1,198 @@
+#----- Running cloud events outside of the receiving thread
+import queue
+import time
+import traceback
+from collections import deque
+from threading import Thread, Lock
+from .keepalive import percentile
+
+_OVERFLOW_POLICIES = ("block", "drop", "drop_oldest")
+
+def _call(function, args):
+    try:
+        function(*args)
+    except Exception as e:
+        print("Warning: Caught error in cloud event - Full error below")
+        try:
+            traceback.print_exc()
+        except Exception:
+            print(e)
+
+class InlineDispatcher:
+    """
+    Calls the cloud events right away in the thread that received the cloud activity. This is what cloud event handlers do if no dispatcher is set.
+    """
+
+    def submit(self, key, function, *args):
+        _call(function, args)
+
+    def stop(self):
+        pass
+
+    def stats(self):
+        return {"queued": 0, "max_queued": 0, "submitted": 0, "dropped": 0, "completed": 0, "active": 0, "handler_ms": None}
+
+class _QueueDispatcher:
+    # base class for the dispatchers that call the cloud events from worker threads
+
+    def __init__(self, workers, max_queue, overflow):
+        if overflow not in _OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {', '.join(_OVERFLOW_POLICIES)}")
+        self.workers = workers
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self._lock = Lock()
+        self.submitted = 0
+        self.dropped = 0
+        self.completed = 0
+        self.max_queued = 0
+        self.active = 0 # the number of calls that are running right now
+        self._durations = deque(maxlen=1000) # how long the last calls took
+        self.running = True
+
+    def _start_worker(self, work_queue):
+        thread = Thread(target=self._work, args=(work_queue,), daemon=True)
+        thread.start()
+        return thread
+
+    def _put(self, work_queue, item):
+        if not self.running:
+            raise RuntimeError("The dispatcher was stopped")
+        if self.overflow == "block":
+            work_queue.put(item)
+        else:
+            while True:
+                try:
+                    work_queue.put_nowait(item)
+                    break
+                except queue.Full:
+                    if self.overflow == "drop":
+                        with self._lock:
+                            self.dropped += 1
+                        return
+                    try:
+                        work_queue.get_nowait() # drop_oldest: makes room by removing the oldest waiting call
+                        work_queue.task_done()
+                        with self._lock:
+                            self.dropped += 1
+                    except queue.Empty:
+                        pass
+        with self._lock:
+            self.submitted += 1
+            queued = work_queue.qsize()
+            if queued > self.max_queued:
+                self.max_queued = queued
+
+    def _work(self, work_queue):
+        while True:
+            item = work_queue.get()
+            if item is None:
+                work_queue.task_done()
+                return
+            with self._lock:
+                self.active += 1
+            started = time.perf_counter()
+            _call(*item)
+            duration = time.perf_counter() - started
+            work_queue.task_done()
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+                self._durations.append(duration)
+
+    def _stop(self, queues, threads):
+        self.running = False
+        for work_queue in queues:
+            work_queue.put(None) # one stop signal per worker, the workers call the already queued events first
+        for thread in threads:
+            thread.join()
+
+    def _stats(self, queues):
+        with self._lock:
+            durations = sorted(duration * 1000 for duration in self._durations)
+            return {
+                "queued": sum(work_queue.qsize() for work_queue in queues),
+                "max_queued": self.max_queued,
+                "submitted": self.submitted,
+                "dropped": self.dropped,
+                "completed": self.completed,
+                "active": self.active,
+                "handler_ms": None if durations == [] else {
+                    "p50": percentile(durations, 50),
+                    "p90": percentile(durations, 90),
+                    "p99": percentile(durations, 99),
+                    "max": durations[-1],
+                },
+            }
+
+class ThreadPoolDispatcher(_QueueDispatcher):
+    """
+    Calls the cloud events from a pool of worker threads, so a slow event doesn't stop the cloud event handler from receiving cloud activity. Events may run in parallel and finish in a different order than the activity was received.
+
+    One dispatcher can be shared by several cloud event handlers.
+
+    Keyword Arguments:
+        workers (int): The number of worker threads
+        max_queue (int): Maximum number of events that wait for a worker
+        overflow (str): What happens when the queue is full: "block" (the cloud event handler waits until there's room, which also slows down reading from the cloud server), "drop" (the new event is dropped) or "drop_oldest" (the oldest waiting event is dropped)
+    """
+
+    def __init__(self, *, workers=4, max_queue=1000, overflow="block"):
+        super().__init__(workers, max_queue, overflow)
+        self._queue = queue.Queue(max_queue)
+        self._threads = [self._start_worker(self._queue) for i in range(workers)]
+
+    def submit(self, key, function, *args):
+        """
+        Queues a call of function(*args). The key is ignored, it only exists so all dispatchers can be used the same way.
+        """
+        self._put(self._queue, (function, args))
+
+    def stop(self):
+        """
+        Calls the events that are still queued, then stops the worker threads.
+        """
+        if self.running:
+            self._stop([self._queue] * len(self._threads), self._threads)
+
+    def stats(self):
+        """
+        Returns:
+            dict: The number of queued, running, submitted, dropped and completed events, and how long the last 1000 events took in milliseconds (p50, p90, p99, max)
+        """
+        return self._stats([self._queue])
+
+class SerialDispatcher(_QueueDispatcher):
+    """
+    Calls the cloud events from worker threads, keeping the order of the events of each cloud variable: All events of a variable are called one after another by the same worker, while events of different variables can run in parallel.
+
+    Keyword Arguments:
+        workers (int): The number of worker threads. The cloud variables are spread over the workers by their names.
+        max_queue (int): Maximum number of events that wait for each worker
+        overflow (str): What happens when the queue of a worker is full: "block", "drop" or "drop_oldest" (see :class:`ThreadPoolDispatcher`)
+    """
+
+    def __init__(self, *, workers=4, max_queue=1000, overflow="block"):
+        super().__init__(workers, max_queue, overflow)
+        self._queues = [queue.Queue(max_queue) for i in range(workers)]
+        self._threads = [self._start_worker(work_queue) for work_queue in self._queues]
+
+    def submit(self, key, function, *args):
+        """
+        Queues a call of function(*args) on the worker responsible for key (the name of the cloud variable).
+        """
+        self._put(self._queues[hash(key) % self.workers], (function, args))
+
+    def stop(self):
+        """
+        Calls the events that are still queued, then stops the worker threads.
+        """
+        if self.running:
+            self._stop(self._queues, self._threads)
+
+    def stats(self):
+        """
+        Returns:
+            dict: The number of queued, running, submitted, dropped and completed events, and how long the last 1000 events took in milliseconds (p50, p90, p99, max)
+        """
+        return self._stats(self._queues)
@@ -0,0 +1,242 @@
+#----- Reading many cloud websockets from one thread
+import selectors
+import socket
+import ssl
+import time
+import websocket
+from threading import Thread, Lock
+
+class _FrameReader:
+    """
+    Incremental parser for the websocket frames received on one connection. The hub feeds it whatever the socket returns, so a frame that arrives in pieces doesn't block the hub until the rest of it is received.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._fragments = None # (opcode, list of payloads) of a message that was split into several frames
+
+    def feed(self, data):
+        self._buffer += data
+
+    def frames(self):
+        """
+        Yields the (opcode, payload) pairs of the complete frames in the buffer. Fragmented messages are put together, control frames are yielded right away.
+        """
+        buffer = self._buffer
+        while len(buffer) >= 2:
+            fin = buffer[0] & 0x80
+            opcode = buffer[0] & 0x0f
+            masked = buffer[1] & 0x80
+            length = buffer[1] & 0x7f
+            position = 2
+            if length == 126:
+                if len(buffer) < 4:
+                    return
+                length = int.from_bytes(buffer[2:4], "big")
+                position = 4
+            elif length == 127:
+                if len(buffer) < 10:
+                    return
+                length = int.from_bytes(buffer[2:10], "big")
+                position = 10
+            mask_key = None
+            if masked: # servers don't mask their frames, but it's allowed to be handled
+                if len(buffer) < position + 4:
+                    return
+                mask_key = bytes(buffer[position:position + 4])
+                position += 4
+            if len(buffer) < position + length:
+                return
+            payload = bytes(buffer[position:position + length])
+            del buffer[:position + length]
+            if mask_key is not None:
+                payload = websocket.ABNF.mask(mask_key, payload)
+            if opcode >= 0x8:
+                yield opcode, payload
+            elif opcode == websocket.ABNF.OPCODE_CONT:
+                if self._fragments is None:
+                    continue
+                self._fragments[1].append(payload)
+                if fin:
+                    opcode, payloads = self._fragments
+                    self._fragments = None
+                    yield opcode, b"".join(payloads)
+            elif not fin:
+                self._fragments = (opcode, [payload])
+            else:
+                yield opcode, payload
+
+class CloudHub:
+    """
+    Reads the websockets of many websocket-based cloud event handlers (:class:`scratchattach.cloud.TwCloudEvents` / :class:`scratchattach.cloud.WsCloudEvents`) from one thread, so the number of threads doesn't grow with the number of projects.
+
+    The hub waits until one of the registered websockets can be read, then calls the events of the event handler the websocket belongs to. The events are called in the hub's thread, so they should return quickly.
+
+    Example::
+
+        hub = scratchattach.CloudHub()
+        hub.add(events1)
+        hub.add(events2)
+        hub.start()
+    """
+
+    def __init__(self):
+        self._selector = selectors.DefaultSelector()
+        self._lock = Lock()
+        self._changes = [] # (event handler, whether it should be registered) pairs, applied by the hub's thread
+        self._sockets = {} # maps the event handlers to the websocket sockets they are registered with
+        self._readers = {} # maps the event handlers to the _FrameReader objects that parse the data received on their sockets
+        self._retry_at = {} # maps the event handlers whose reconnect failed to the time of the next attempt
+        self._wakeup_receiver, self._wakeup_sender = socket.socketpair()
+        self._wakeup_receiver.setblocking(False)
+        self._selector.register(self._wakeup_receiver, selectors.EVENT_READ, None)
+        self._thread = None
+        self.running = False
+
+    def add(self, events):
+        """
+        Adds a cloud event handler to the hub and calls its on_ready event. The event handler must not be started with events.start().
+
+        Args:
+            events: A TwCloudEvents or WsCloudEvents object
+        """
+        if not hasattr(events, "connection"):
+            raise ValueError("Only websocket-based cloud event handlers (TwCloudEvents, WsCloudEvents) can be added to a CloudHub")
+        events._hub = self
+        events.running = True
+        events.connection._readers.add(self)
+        if "on_ready" in events._events:
+            events._events["on_ready"]()
+        self._change(events, True)
+
+    def remove(self, events):
+        """
+        Removes a cloud event handler from the hub. The websocket connection of the event handler stays open.
+        """
+        events.connection._readers.discard(self)
+        self._change(events, False)
+
+    def _change(self, events, register):
+        with self._lock:
+            self._changes.append((events, register))
+        self._wakeup_sender.send(b"\0")
+
+    def _apply_changes(self):
+        with self._lock:
+            changes = self._changes
+            self._changes = []
+        for events, register in changes:
+            self._unregister(events)
+            if register:
+                self._register(events)
+
+    def _register(self, events):
+        sock = events.connection.websocket.sock
+        if sock is None:
+            return
+        self._selector.register(sock, selectors.EVENT_READ, events)
+        self._sockets[events] = sock
+        self._readers[events] = _FrameReader()
+        # messages the keepalive thread received before the event handler was added
+        while len(events.connection._backlog) > 0:
+            events._handle_message(events.connection._backlog.popleft())
+
+    def _unregister(self, events):
+        self._retry_at.pop(events, None)
+        sock = self._sockets.pop(events, None)
+        self._readers.pop(events, None)
+        if sock is not None:
+            try:
+                self._selector.unregister(sock)
+            except (KeyError, ValueError):
+                pass
+
+    def start(self, *, thread=True):
+        """
+        Starts reading the websockets of the added event handlers.
+
+        Keyword Arguments:
+            thread (boolean): Whether the hub should be run in a thread.
+        """
+        if self.running is False:
+            self.running = True
+            if thread:
+                self._thread = Thread(target=self._run, daemon=True)
+                self._thread.start()
+            else:
+                self._thread = None
+                self._run()
+
+    def stop(self):
+        """
+        Stops the hub. The websocket connections of the added event handlers stay open.
+        """
+        self.running = False
+        self._wakeup_sender.send(b"\0")
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while self.running:
+            self._apply_changes()
+            now = time.time()
+            for events in [events for events, retry_at in self._retry_at.items() if retry_at <= now]:
+                self._reconnect(events)
+            for key, mask in self._selector.select(timeout=1):
+                if key.data is None:
+                    try:
+                        self._wakeup_receiver.recv(4096)
+                    except BlockingIOError:
+                        pass
+                    continue
+                self._read(key.data)
+
+    def _read(self, events):
+        # reads what the socket has available without waiting for complete frames (on TLS connections, at most for the rest of a TLS record). The rest of a frame is read the next time the socket is readable
+        ws = events.connection.websocket
+        sock = self._sockets[events]
+        reader = self._readers[events]
+        try:
+            while True:
+                try:
+                    data = sock.recv(65536)
+                except (BlockingIOError, ssl.SSLWantReadError):
+                    break
+                if data == b"":
+                    raise ConnectionError("The cloud server closed the connection")
+                reader.feed(data)
+                # data that was already decrypted by the ssl layer doesn't make the socket readable again, so it's read right away
+                pending = getattr(sock, "pending", None)
+                if pending is None or pending() == 0:
+                    break
+        except Exception:
+            self._reconnect(events)
+            return
+        for opcode, payload in reader.frames():
+            if opcode == websocket.ABNF.OPCODE_CLOSE:
+                self._reconnect(events)
+                return
+            if opcode == websocket.ABNF.OPCODE_PING:
+                try:
+                    ws.pong(payload)
+                except Exception:
+                    pass
+            elif opcode == websocket.ABNF.OPCODE_PONG and events.connection.keepalive is not None:
+                events.connection.keepalive._on_pong(payload)
+            elif opcode in (websocket.ABNF.OPCODE_TEXT, websocket.ABNF.OPCODE_BINARY) and events.running:
+                events._handle_message(payload) # the framer parses the bytes directly
+
+    def _reconnect(self, events):
+        sock = self._sockets.get(events)
+        self._unregister(events)
+        if not events.running:
+            return
+        connection = events.connection
+        if sock is None or connection.websocket.sock is sock or not connection.websocket.connected:
+            # the hub doesn't block: only one attempt is made, the next one is scheduled as specified by the connection's reconnect policy
+            events._reconnect(blocking=False)
+        if connection.websocket.connected:
+            self._register(events)
+        else:
+            self._retry_at[events] = time.time() + max(connection.reconnect_policy.next_delay(), 0.1)
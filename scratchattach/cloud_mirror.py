@@ -0,0 +1,91 @@
+#----- Local copy of a project's cloud variables
+from threading import Lock
+from . import cloud
+
+class CloudStateMirror:
+    """
+    Keeps an in-memory copy of the cloud variables of a project, so reading them doesn't need a request to the cloud server.
+
+    The mirror is seeded once (from the clouddata logs on Scratch, TurboWarp's cloud server sends the current values itself after the handshake) and then kept up to date with the set packets received from the cloud websocket. Values set with the connection's set_var / set_vars methods are visible right away (read-your-writes).
+
+    Args:
+        connection: A CloudConnection or TwCloudConnection object
+
+    Keyword Arguments:
+        events: (optional) A started (or hub-managed) WsCloudEvents or TwCloudEvents object that reads the connection's websocket. If this isn't provided, the mirror starts its own WsCloudEvents object in a thread.
+        seed (boolean): Whether the mirror should be seeded with the values from the clouddata logs (only applies to Scratch's cloud server)
+    """
+
+    def __init__(self, connection, *, events=None, seed=True):
+        self.connection = connection
+        self._values = {}
+        self._versions = {}
+        self._lock = Lock()
+
+        if seed and isinstance(connection, cloud.CloudConnection):
+            clouddata = cloud.get_cloud(connection.project_id)
+            if isinstance(clouddata, dict): # get_cloud returns a list if fetching the logs fails
+                self._update(clouddata)
+
+        connection._write_listeners.append(self._on_write)
+        if events is None:
+            self.events = cloud.WsCloudEvents(connection.project_id, connection)
+            self.events.subscribe("*", self._on_packet)
+            self.events.start(thread=True)
+            self._owns_events = True
+        else:
+            self.events = events
+            self.events.subscribe("*", self._on_packet)
+            self._owns_events = False
+
+    def _update(self, variables):
+        with self._lock:
+            for variable, value in variables.items():
+                self._values[variable] = value
+                self._versions[variable] = self._versions.get(variable, 0) + 1
+
+    def _on_write(self, variables):
+        self._update(variables)
+
+    def _on_packet(self, activity):
+        if activity.get("method") == "set":
+            self._update({activity["name"][2:]: activity["value"]})
+
+    def get_var(self, variable):
+        """
+        Gets the value of a cloud variable from the mirror.
+
+        Args:
+            variable (str): The name of the cloud variable (specified without the cloud emoji)
+
+        Returns:
+            str: The cloud variable's value. If the mirror doesn't know the variable, None is returned.
+        """
+        return self._values.get(variable)
+
+    def get_cloud(self):
+        """
+        Returns:
+            dict: The values of all cloud variables known to the mirror
+        """
+        with self._lock:
+            return dict(self._values)
+
+    def get_version(self, variable):
+        """
+        Gets the version of a cloud variable. The version is increased every time the mirror receives a new value for the variable, so it can be used to detect updates.
+
+        Returns:
+            int: The version of the variable (0 if the mirror doesn't know the variable)
+        """
+        return self._versions.get(variable, 0)
+
+    def stop(self):
+        """
+        Stops updating the mirror. If the mirror started its own cloud event handler, it is paused (its thread exits once the next message arrives).
+        """
+        if self._on_write in self.connection._write_listeners:
+            self.connection._write_listeners.remove(self._on_write)
+        self.events.unsubscribe(self._on_packet)
+        if self._owns_events:
+            self.events.pause()
@@ -0,0 +1,221 @@
+#----- Reusing TurboWarp cloud connections for short lookups
+import time
+from collections import OrderedDict
+from threading import Thread, Event, Lock
+from . import cloud
+from .cloud_mirror import CloudStateMirror
+
+class _PoolEntry:
+
+    def __init__(self):
+        self.connection = None
+        self.mirror = None
+        self.error = None
+        self.closed = False
+        self.opened = Event() # set when the connection was opened (or opening it failed)
+        self.snapshot = Event() # set when the first values were received
+        self.last_used = time.monotonic()
+
+    def _on_packet(self, activity):
+        self.snapshot.set()
+
+    def open(self, project_id, cloud_host, purpose, contact, snapshot_timeout):
+        self.connection = cloud.TwCloudConnection(project_id=project_id, cloud_host=cloud_host, purpose=purpose, contact=contact)
+        # the pool starts the event handler itself: it's subscribed to before it reads the first message, and it runs in a daemon thread, so pooled connections don't keep the program running
+        events = cloud.WsCloudEvents(self.connection.project_id, self.connection)
+        events.subscribe("*", self._on_packet)
+        self.mirror = CloudStateMirror(self.connection, events=events)
+        events.start(thread=True, daemon=True)
+        # TurboWarp's cloud server sends the current values right after the handshake. Projects without cloud variables don't get this message
+        self.snapshot.wait(snapshot_timeout)
+        events.unsubscribe(self._on_packet)
+
+    def is_alive(self):
+        # False if the connection was lost (its event handler may still be trying to re-open it), so the mirror's values may be stale
+        connection = self.connection
+        return (
+            not self.closed and not connection.is_closed
+            and connection.websocket is not None and connection.websocket.connected
+            and self.mirror.events.running
+        )
+
+    def close(self):
+        self.closed = True
+        if self.mirror is not None:
+            self.mirror.stop()
+            self.mirror.events.pause() # its thread exits when the connection is closed
+        if self.connection is not None:
+            self.connection.disconnect()
+
+class TwCloudPool:
+    """
+    Keeps the connections that were opened for looking up the cloud variables of TurboWarp projects open, so following lookups of the same project are answered from a :class:`scratchattach.cloud_mirror.CloudStateMirror` without opening a new connection.
+
+    There's one connection per project, cloud server, purpose and contact. Connections that were lost are closed and opened again by the next lookup. Connections that weren't used for ``ttl`` seconds are closed, and if there are more than ``max_connections``, the least recently used ones are closed. The threads of the pool are daemon threads, so open connections don't keep the program running.
+
+    :func:`scratchattach.cloud.get_tw_cloud` and :func:`scratchattach.cloud.get_tw_var` use the process-wide pool returned by :func:`get_tw_cloud_pool`.
+
+    Keyword Arguments:
+        max_connections (int): Maximum number of open connections
+        ttl (float): How long (in seconds) an unused connection is kept open
+        snapshot_timeout (float): How long (in seconds) to wait for the current values after opening a connection
+
+    Attributes:
+
+    :.hits: The number of lookups that were answered by an already open connection
+
+    :.misses: The number of lookups that opened a new connection
+
+    :.evictions: The number of connections that were closed by the pool
+    """
+
+    def __init__(self, *, max_connections=16, ttl=300, snapshot_timeout=1):
+        self.max_connections = max_connections
+        self.ttl = ttl
+        self.snapshot_timeout = snapshot_timeout
+        self._entries = OrderedDict() # maps (project id, cloud host, purpose, contact) to _PoolEntry objects, least recently used first
+        self._lock = Lock()
+        self._reaper = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _evict(self, now):
+        # removes the expired entries and the least recently used ones that exceed max_connections. Returns the removed entries, they have to be closed without holding the lock
+        evicted = []
+        while len(self._entries) > 0:
+            key, entry = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_connections and now - entry.last_used < self.ttl:
+                break
+            del self._entries[key]
+            evicted.append(entry)
+        self.evictions += len(evicted)
+        return evicted
+
+    def _reap(self):
+        # closes expired connections while the pool has connections
+        while True:
+            time.sleep(min(self.ttl, 5))
+            with self._lock:
+                evicted = self._evict(time.monotonic())
+                if len(self._entries) == 0:
+                    self._reaper = None
+            for entry in evicted:
+                entry.close()
+            if self._reaper is None:
+                return
+
+    def mirror(self, project_id, *, cloud_host=None, purpose="", contact=""):
+        """
+        Returns the mirror of a project's cloud variables, opening a connection for the project if the pool doesn't have one.
+
+        Args:
+            project_id (str):
+
+        Keyword Arguments:
+            cloud_host (str): (optional) The websocket URL of the cloud server (TurboWarp's by default)
+            purpose (str): (optional) Provide information about what you're using TurboWarp's cloud server for. Lookups with a different purpose use a different connection.
+            contact (str): (optional) Provide an email address or another way you can be contacted. Lookups with a different contact use a different connection.
+
+        Returns:
+            scratchattach.cloud_mirror.CloudStateMirror
+        """
+        key = (str(project_id), cloud_host, purpose, contact)
+        now = time.monotonic()
+        with self._lock:
+            evicted = self._evict(now)
+            entry = self._entries.get(key)
+            if entry is not None and entry.opened.is_set() and entry.error is None and not entry.is_alive():
+                # the connection was lost, a new one is opened instead of returning stale values
+                del self._entries[key]
+                evicted.append(entry)
+                self.evictions += 1
+                entry = None
+            opener = entry is None
+            if opener:
+                self.misses += 1
+                entry = self._entries[key] = _PoolEntry()
+                evicted += self._evict(now)
+                if self._reaper is None:
+                    self._reaper = Thread(target=self._reap, daemon=True)
+                    self._reaper.start()
+            else:
+                self.hits += 1
+                entry.last_used = now
+                self._entries.move_to_end(key)
+        for old_entry in evicted:
+            old_entry.close()
+        if opener:
+            try:
+                entry.open(project_id, cloud_host, purpose, contact, self.snapshot_timeout)
+            except Exception as e:
+                entry.error = e
+                with self._lock:
+                    if self._entries.get(key) is entry:
+                        del self._entries[key]
+                entry.close()
+                raise
+            finally:
+                entry.opened.set()
+            if entry.closed: # evicted while it was opened
+                entry.close()
+        else:
+            entry.opened.wait()
+            if entry.error is not None:
+                raise entry.error
+        return entry.mirror
+
+    def get_cloud(self, project_id, **kwargs):
+        """
+        Gets the values of a project's cloud variables. Takes the same arguments as :meth:`mirror`.
+
+        Returns:
+            list: The set packets (dicts with the keys "method", "name" and "value") of the project's cloud variables, like :func:`scratchattach.cloud.get_tw_cloud`
+        """
+        values = self.mirror(project_id, **kwargs).get_cloud()
+        return [{"method": "set", "name": "☁ " + variable, "value": value} for variable, value in values.items()]
+
+    def get_var(self, project_id, variable, **kwargs):
+        """
+        Gets the value of a cloud variable (specified without the cloud emoji). Takes the same keyword arguments as :meth:`mirror`.
+
+        Returns:
+            str: The cloud variable's value, None if it isn't known
+        """
+        return self.mirror(project_id, **kwargs).get_var(variable)
+
+    def evict(self, project_id, *, cloud_host=None, purpose="", contact=""):
+        """
+        Closes the pooled connection of a project. Takes the same keyword arguments as :meth:`mirror`.
+        """
+        with self._lock:
+            entry = self._entries.pop((str(project_id), cloud_host, purpose, contact), None)
+        if entry is not None:
+            entry.close()
+
+    def close(self):
+        """
+        Closes all pooled connections. The pool can still be used afterwards.
+        """
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            entry.close()
+
+    def stats(self):
+        """
+        Returns:
+            dict: The number of open connections, hits, misses and evictions
+        """
+        with self._lock:
+            return {"connections": len(self._entries), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+_default_pool = TwCloudPool()
+
+def get_tw_cloud_pool():
+    """
+    Returns:
+        TwCloudPool: The process-wide pool used by :func:`scratchattach.cloud.get_tw_cloud` and :func:`scratchattach.cloud.get_tw_var`. Its max_connections, ttl and snapshot_timeout attributes can be changed.
+    """
+    return _default_pool
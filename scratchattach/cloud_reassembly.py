@@ -0,0 +1,132 @@
+#----- Bounded state of the cloud request handler
+import time
+from collections import OrderedDict
+from threading import Lock
+
+class RecentRequestIds:
+    """
+    Remembers the ids of the last requests a cloud request handler responded to, so a request that is received twice (for example from the websocket and from the clouddata logs) is only responded to once. Adding and looking up an id takes constant time, and when more than max_size ids are remembered, the least recently added one is forgotten.
+
+    Keyword Arguments:
+        max_size (int): Maximum number of remembered request ids
+    """
+
+    def __init__(self, *, max_size=15):
+        self.max_size = max_size
+        self._ids = OrderedDict()
+
+    def __contains__(self, request_id):
+        return request_id in self._ids
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __iter__(self):
+        # newest first, like the list that was used before
+        return reversed(list(self._ids))
+
+    def add(self, request_id):
+        """
+        Remembers a request id.
+
+        Returns:
+            boolean: False if the id was already remembered
+        """
+        if request_id in self._ids:
+            self._ids.move_to_end(request_id)
+            return False
+        self._ids[request_id] = None
+        if len(self._ids) > self.max_size:
+            self._ids.popitem(last=False)
+        return True
+
+class RequestPartStore:
+    """
+    Collects the parts of requests that were split into several packets until the last packet arrives. Requests whose last packet doesn't arrive within ttl seconds are dropped, and if the stored parts are bigger than max_bytes, the oldest unfinished requests are dropped, so the memory used by unfinished requests stays bounded.
+
+    Keyword Arguments:
+        ttl (float): How long (in seconds) the parts of an unfinished request are kept
+        max_bytes (int): Maximum total size of the stored parts (in bytes, UTF-8 encoded)
+
+    Attributes:
+
+    :.completed: The number of requests whose parts were put together
+
+    :.expired: The number of unfinished requests that were dropped because of the ttl
+
+    :.evicted: The number of unfinished requests that were dropped because of max_bytes
+    """
+
+    def __init__(self, *, ttl=60, max_bytes=1000000):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._requests = OrderedDict() # maps the request ids to [time of the first part, list of parts, size of the parts in bytes], oldest first
+        self._lock = Lock()
+        self.bytes = 0
+        self.completed = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def __contains__(self, request_id):
+        return request_id in self._requests
+
+    def __len__(self):
+        return len(self._requests)
+
+    def _drop_oldest(self):
+        request_id, (started, parts, size) = self._requests.popitem(last=False)
+        self.bytes -= size
+
+    def _expire(self, now):
+        while len(self._requests) > 0 and next(iter(self._requests.values()))[0] < now - self.ttl:
+            self._drop_oldest()
+            self.expired += 1
+
+    def add(self, request_id, part):
+        """
+        Stores a part of a request.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._requests.get(request_id)
+            if entry is None:
+                entry = self._requests[request_id] = [now, [], 0]
+            size = len(part.encode("utf-8"))
+            entry[1].append(part)
+            entry[2] += size
+            self.bytes += size
+            while self.bytes > self.max_bytes and len(self._requests) > 0:
+                self._drop_oldest()
+                self.evicted += 1
+
+    def pop(self, request_id):
+        """
+        Removes the stored parts of a request and returns them.
+
+        Returns:
+            str: The stored parts put together ("" if no parts are stored)
+        """
+        with self._lock:
+            self._expire(time.monotonic())
+            entry = self._requests.pop(request_id, None)
+            if entry is None:
+                return ""
+            self.bytes -= entry[2]
+            self.completed += 1
+            return "".join(entry[1])
+
+    def stats(self):
+        """
+        Returns:
+            dict: The number of unfinished requests, the size of their stored parts in bytes, and the numbers of completed, expired and evicted requests
+        """
+        with self._lock:
+            self._expire(time.monotonic())
+            return {
+                "pending": len(self._requests),
+                "bytes": self.bytes,
+                "completed": self.completed,
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
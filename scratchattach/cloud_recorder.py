@@ -0,0 +1,259 @@
+#----- Recording and replaying cloud traffic
+import mmap
+import os
+import struct
+import time
+import traceback
+from collections import namedtuple
+from threading import Lock
+from . import cloud
+from .cloud_subscriptions import SubscriptionRegistry
+
+_MAGIC = b"SACLOUD1"
+_RECORD = struct.Struct("<dBHIH") # timestamp, kind, length of the variable name, length of the value, length of the username
+
+RECEIVED = 0 # cloud variable set received from the cloud server
+SENT = 1 # cloud variable set sent by a connection
+
+Record = namedtuple("Record", ["timestamp", "kind", "var", "value", "user"])
+Record.__doc__ = "A recorded cloud variable set. kind is RECEIVED or SENT, user is None if it is unknown."
+
+class CloudRecorder:
+    """
+    Appends the cloud variable sets of cloud connections and cloud event handlers to a binary file, together with the time they were sent / received. Use :class:`CloudRecording` to read the file and :class:`ReplayCloudEvents` to replay it.
+
+    Args:
+        path (str): The file the sets are appended to. It is created if it doesn't exist.
+
+    Example::
+
+        with scratchattach.CloudRecorder("traffic.bin") as recorder:
+            recorder.attach(events) # records the received sets
+            recorder.attach(conn) # records the sets made with conn.set_var / conn.set_vars
+            ...
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = Lock()
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(_MAGIC)
+        self._attached = []
+        self.records = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def record(self, kind, var, value, user=None, *, timestamp=None):
+        """
+        Appends a cloud variable set to the file.
+
+        Args:
+            kind (int): RECEIVED or SENT
+            var (str): The name of the cloud variable (without the cloud emoji)
+            value: The value the cloud variable was set to
+            user (str): (optional) The user who set the variable
+        """
+        var = var.encode("utf-8")
+        value = str(value).encode("utf-8")
+        user = b"" if user is None else user.encode("utf-8")
+        data = _RECORD.pack(time.time() if timestamp is None else timestamp, kind, len(var), len(value), len(user)) + var + value + user
+        with self._lock:
+            self._file.write(data)
+            self.records += 1
+
+    def _on_write(self, variables, user):
+        for var, value in variables.items():
+            self.record(SENT, var, value, user)
+
+    def _on_packet(self, activity):
+        if activity.get("method") == "set" or activity.get("verb") == "set_var":
+            self.record(RECEIVED, activity["name"][2:], activity["value"], activity.get("user"))
+
+    def attach(self, source):
+        """
+        Starts recording the sets of a cloud connection (the sets it sends) or of a cloud event handler (the sets it receives).
+
+        Args:
+            source: A CloudConnection / TwCloudConnection object or a CloudEvents / TwCloudEvents / WsCloudEvents object
+        """
+        if hasattr(source, "_write_listeners"):
+            listener = lambda variables: self._on_write(variables, source._username)
+            source._write_listeners.append(listener)
+            self._attached.append((source, listener))
+        elif hasattr(source, "subscribe"):
+            source.subscribe("*", self._on_packet)
+            self._attached.append((source, self._on_packet))
+        else:
+            raise ValueError("Only cloud connections and cloud event handlers can be recorded")
+
+    def detach(self, source):
+        """
+        Stops recording the sets of a cloud connection or cloud event handler.
+        """
+        for attached, listener in list(self._attached):
+            if attached is not source:
+                continue
+            if hasattr(source, "_write_listeners"):
+                source._write_listeners.remove(listener)
+            else:
+                source.unsubscribe(listener)
+            self._attached.remove((attached, listener))
+
+    def flush(self):
+        """
+        Writes the buffered records to the file.
+        """
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        """
+        Stops recording all sources and closes the file.
+        """
+        for source, listener in list(self._attached):
+            self.detach(source)
+        with self._lock:
+            self._file.close()
+
+class CloudRecording:
+    """
+    Reads a file written by :class:`CloudRecorder`. The file is memory-mapped, so big recordings aren't loaded into memory at once.
+
+    Args:
+        path (str): The recorded file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        if size < len(_MAGIC):
+            self._file.close()
+            raise ValueError("The file isn't a cloud recording")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(_MAGIC)] != _MAGIC:
+            self.close()
+            raise ValueError("The file isn't a cloud recording")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __iter__(self):
+        return self.records()
+
+    def records(self, *, kind=None, start=None):
+        """
+        Generator that yields the recorded sets in the order they were recorded. A record that was only partially written (for example because the recording program crashed) ends the recording.
+
+        Keyword Arguments:
+            kind (int): (optional) Only yield RECEIVED or only yield SENT records
+            start (int): (optional) The byte offset to start at, as returned by :meth:`records_with_offsets`
+
+        Yields:
+            Record
+        """
+        for offset, record in self.records_with_offsets(kind=kind, start=start):
+            yield record
+
+    def records_with_offsets(self, *, kind=None, start=None):
+        """
+        Like :meth:`records`, but yields (offset of the next record, record) pairs, so reading can be resumed from an offset.
+        """
+        data = self._map
+        offset = len(_MAGIC) if start is None else start
+        end = len(data)
+        while offset + _RECORD.size <= end:
+            timestamp, record_kind, var_length, value_length, user_length = _RECORD.unpack_from(data, offset)
+            position = offset + _RECORD.size
+            next_offset = position + var_length + value_length + user_length
+            if next_offset > end:
+                return
+            offset = next_offset
+            if kind is not None and record_kind != kind:
+                continue
+            var = data[position:position + var_length].decode("utf-8")
+            position += var_length
+            value = data[position:position + value_length].decode("utf-8")
+            position += value_length
+            user = data[position:position + user_length].decode("utf-8") if user_length > 0 else None
+            yield next_offset, Record(timestamp, record_kind, var, value, user)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+class ReplayCloudEvents(cloud.CloudEvents):
+    """
+    Cloud event handler that calls the events for the received sets of a recording instead of receiving them from a cloud server. It can be used like the other cloud event handlers (including the dispatcher keyword argument and subscriptions), for example to test a CloudRequests handler with recorded traffic.
+
+    Args:
+        path (str): The file written by :class:`CloudRecorder`
+
+    Keyword Arguments:
+        speed (float): How fast the recording is replayed: 1 keeps the original timing, 2 is twice as fast. 0 replays the sets as fast as possible.
+
+    The on_disconnect event is called when the end of the recording is reached.
+    """
+
+    def __init__(self, path, *, speed=1.0, **entries):
+        self.recording = CloudRecording(path)
+        self.speed = speed
+        self.data = []
+        self._thread = None
+        self._hub = None
+        self._subscriptions = SubscriptionRegistry()
+        self.running = False
+        self._events = {}
+        self._event_filters = {}
+        self._handlers = {}
+        self.dispatcher = None
+        self.update_interval = 0
+        self._offset = None # where the replay continues after it was paused
+        self.__dict__.update(entries)
+
+    def _update(self):
+        first = None
+        started = time.perf_counter()
+        for offset, record in self.recording.records_with_offsets(kind=RECEIVED, start=self._offset):
+            if not self.running:
+                return
+            if first is None:
+                first = record.timestamp
+            if self.speed > 0:
+                due = started + (record.timestamp - first) / self.speed
+                while self.running and time.perf_counter() < due:
+                    time.sleep(min(0.5, due - time.perf_counter()))
+                if not self.running:
+                    return
+            raw_name = "☁ " + record.var
+            try:
+                if len(self._subscriptions) > 0:
+                    packet = {"method": "set", "name": raw_name, "value": record.value}
+                    for callback in self._subscriptions.match(raw_name):
+                        callback(packet)
+                self._emit("set", raw_name, record.user, record.value, record.timestamp * 1000)
+            except Exception as e:
+                print("Warning: Caught error in cloud event - Full error below")
+                try:
+                    traceback.print_exc()
+                except Exception:
+                    print(e)
+            self._offset = offset
+        self.running = False
+        if "on_disconnect" in self._events:
+            self._events["on_disconnect"]()
+
+    def stop(self):
+        """
+        Permanently stops the replay and closes the recording.
+        """
+        super().stop()
+        self.recording.close()
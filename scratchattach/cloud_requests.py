@@ -1,16 +1,27 @@
 #----- The cloud request handler class
 from . import cloud
+from .cloud_stream import MergedCloudEvents
+from .cloud_dispatch import ThreadPoolDispatcher
+from .cloud_responses import ResponseTransmitter
+from .cloud_reassembly import RecentRequestIds, RequestPartStore
 import time
 from .encoder import *
 from . import project
 import math
-from threading import Thread
+from threading import Thread, Lock, current_thread
+import queue
+import asyncio
 import json
 import traceback
 import warnings
 from . import exceptions
 import requests
 
+def _check_request_pool(request_pool):
+    # requests that are dropped by the pool would already be marked as responded, but never get a response
+    if getattr(request_pool, "overflow", "block") != "block":
+        raise ValueError('The request pool must be created with overflow="block"')
+
 class CloudRequests:
     """
     Framework (inspired by discord.py) that allows Scratch cloud variables and Python to communicate. More information: https://github.com/TimMcCool/scratchattach/wiki/Cloud-Requests
@@ -39,13 +50,23 @@ class CloudRequests:
         self.requests = {}
         self.events = []
 
-        self.request_parts = {}
+        self.request_parts = RequestPartStore() # parts of requests that were split into several packets, unfinished requests are dropped after a ttl or when the parts get too big
+        self.responded_request_ids = RecentRequestIds() # prevents double responses
         self.outputs = {}
+        self._inbox = queue.Queue() # received requests ("request", event), finished threaded requests ("output", request_id) and their exceptions that should be raised ("error", exception), None wakes up the main loop when the handler is stopped
         self.respond_in_thread = False
-        self.current_var = 0
+        self.transmitter = None # ResponseTransmitter that sends the responses, created when the first response is sent
         self.idle_since = 0
+        self.update_interval = 0.1 # interval between two checks of the clouddata logs if the requests are fetched from the logs (run with data_from_websocket=False)
+        self.max_update_interval = 2 # while no requests are found, the interval is increased up to this value
         self.force_reconnect = False
         self.cloud_events = []
+        self._event_connections = [] # connections opened by run() for receiving requests, closed by stop()
+        self.request_pool = None # runs the requests added with thread=True. Created when the first of them is called, if run() didn't get one
+        self._owns_request_pool = False
+        self._async_loop = None # event loop the requests defined with async def run on
+        self._async_thread = None # the thread that runs the event loop
+        self._async_lock = Lock()
         self.kill_signal = False
 
     def __init__(self,
@@ -105,9 +126,11 @@ class CloudRequests:
                 "thread": False
             }
 
-    def call_request(self, request_id, req_obj, arguments):
+    def call_request(self, request_id, req_obj, arguments, requester=None, timestamp=0):
         """
-        Calls a request. Called by the request handler when it detects a request. If the request should be run in a thread, this function is called in a thread.
+        Calls a request. Called by the request handler when it detects a request. If the request should be run in a thread, this function is called in a thread. Requests defined with async def are run on the request handler's event loop.
+
+        The requester and timestamp of the request are passed on to the events, because self.last_requester and self.last_timestamp may already belong to another request when a threaded or async request finishes.
         """
         request = req_obj["name"]
         try:
@@ -118,52 +141,119 @@ class CloudRequests:
                 self.call_event("on_disabled_request", [
                     self.Request(name=request,
                                  request=request,
-                                 requester=self.last_requester,
-                                 timestamp=self.last_timestamp,
+                                 requester=requester,
+                                 timestamp=timestamp,
                                  arguments=arguments,
                                  request_id=request_id)
                 ]) # If the request is disabled, the event is called
                 return None
             output = req_obj["on_call"](*arguments) # Calls the request function and saves the function's returned data in the output variable
-            
+
+            if asyncio.iscoroutine(output):
+                # async def requests run concurrently on the event loop, their output is parsed by the main request handler (like the output of threaded requests)
+                future = asyncio.run_coroutine_threadsafe(output, self._get_async_loop())
+                future.add_done_callback(lambda future: self._finish_async_request(future, request_id, req_obj, arguments, requester, timestamp))
+                return
             if req_obj["thread"]:
                 # If this function is running in a thread, the output is saved in the self.outputs list and parsed by the main request handler
                 self.outputs[request_id] = {
                     "output": output,
                     "request": req_obj
                 }
+                self._inbox.put(("output", request_id))
             else:
                 # If this function is not running in a thread, the output is returned directly 
                 self._parse_output(output, request, req_obj, request_id)
         except Exception as e:
-            # Handles errors: Calls the on_error event, prints the traceback and sends back the error message to the Scratch project
-            self.call_event("on_error", [
-                self.Request(name=request,
-                             request=request,
-                             requester=self.last_requester,
-                             timestamp=self.last_timestamp,
-                             arguments=arguments,
-                             request_id=request_id), e
-            ])
-            if self.ignore_exceptions:
-                print(
-                    f"Warning: Caught error in request '{request}' - Full error below"
-                )
-                try:
-                    traceback.print_exc()
-                except Exception:
-                    print(e)
-            else:
-                print(f"Warning: Exception in request '{request}':")
-                raise (e)
-            if req_obj["thread"]:
-                self.outputs[request_id] = {
-                    "output": f"Error: Check the Python console",
-                    "request": req_obj
-                }
-            else:
-                self._parse_output("Error: Check the Python console", request,
-                                   req_obj, request_id)
+            self._request_failed(e, request_id, req_obj, arguments, requester, timestamp, threaded=req_obj["thread"])
+
+    def _request_failed(self, e, request_id, req_obj, arguments, requester, timestamp, *, threaded):
+        # Handles errors: Calls the on_error event, prints the traceback and sends back the error message to the Scratch project
+        request = req_obj["name"]
+        self.call_event("on_error", [
+            self.Request(name=request,
+                         request=request,
+                         requester=requester,
+                         timestamp=timestamp,
+                         arguments=arguments,
+                         request_id=request_id), e
+        ])
+        if self.ignore_exceptions:
+            print(
+                f"Warning: Caught error in request '{request}' - Full error below"
+            )
+            try:
+                traceback.print_exc()
+            except Exception:
+                print(e)
+        else:
+            print(f"Warning: Exception in request '{request}':")
+        if threaded:
+            self.outputs[request_id] = {
+                "output": f"Error: Check the Python console",
+                "request": req_obj
+            }
+            self._inbox.put(("output", request_id))
+            if not self.ignore_exceptions:
+                # raising it in the worker thread would only end the thread, so it's raised by the main request handler after the error message was sent
+                self._inbox.put(("error", e))
+        else:
+            self._parse_output("Error: Check the Python console", request,
+                               req_obj, request_id)
+            if not self.ignore_exceptions:
+                self._raise(e)
+
+    def _raise(self, e):
+        # raises the exception of a request after the queued responses (including the error message) were sent
+        if self.transmitter is not None:
+            self.transmitter.flush()
+        raise (e)
+
+    def _get_async_loop(self):
+        # returns the event loop the async def requests run on. It's started in a thread when the first of them is called
+        with self._async_lock:
+            if self._async_loop is None:
+                self._async_loop = asyncio.new_event_loop()
+                self._async_thread = Thread(target=self._async_loop.run_forever, daemon=True)
+                self._async_thread.start()
+            return self._async_loop
+
+    def _stop_async_loop(self):
+        # cancels the async def requests that are still running, then stops and closes the event loop
+        with self._async_lock:
+            loop, thread = self._async_loop, self._async_thread
+            self._async_loop = self._async_thread = None
+        if loop is None:
+            return
+        if thread is current_thread(): # stop() was called by an async def request
+            loop.call_soon(loop.stop)
+            return
+
+        async def cancel_requests():
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        asyncio.run_coroutine_threadsafe(cancel_requests(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+    def _finish_async_request(self, future, request_id, req_obj, arguments, requester, timestamp):
+        # called when an async def request finished. Exceptions are raised by the main request handler (if ignore_exceptions is False), not in this callback of the event loop
+        if future.cancelled(): # the request handler was stopped
+            return
+        try:
+            output = future.result()
+        except Exception as e:
+            self._request_failed(e, request_id, req_obj, arguments, requester, timestamp, threaded=True)
+            return
+        self.outputs[request_id] = {
+            "output": output,
+            "request": req_obj
+        }
+        self._inbox.put(("output", request_id))
 
     def add_request(self, function, *, enabled=True, name=None):
         self.request(enabled=enabled, name=name)(function)
@@ -214,7 +304,8 @@ class CloudRequests:
 
         if self.last_requester is None:
             logs = cloud.get_cloud_logs(self.project_id,
-                                         filter_by_var_named="TO_HOST")
+                                         filter_by_var_named="TO_HOST",
+                                         log_url=self.log_url)
             activity = list(
                 filter(lambda x: "." + self.last_request_id in x["value"],
                        logs))
@@ -235,7 +326,8 @@ class CloudRequests:
         Can be used inside a request to get the exact timestamp of when the request was performed.
         """
         logs = cloud.get_cloud_logs(self.project_id,
-                                     filter_by_var_named="TO_HOST")
+                                     filter_by_var_named="TO_HOST",
+                                     log_url=self.log_url)
         activity = list(
             filter(lambda x: "." + self.last_request_id in x["value"],
                    logs))
@@ -246,54 +338,28 @@ class CloudRequests:
 
     def _respond(self, request_id, response, limit, *, validation=2222):
         """
-        Sends back the request response to the Scratch project
+        Sends back the request response to the Scratch project. The response is split into parts that are queued on the response transmitter, which sends them interleaved with the other responses that are being sent
         """
 
-        if (self.idle_since + 8 < time.time() #and not isinstance(self.connection, cloud.TwCloudConnection)
-            ) or self.force_reconnect:
-            self.connection.disconnect()
-            self.connection._connect(cloud_host=self.connection.cloud_host)
-            self.connection._handshake()
+        # the cloud server may have closed the connection while it was idle. If the connection has a keepalive (started with client.connection.start_keepalive()), the keepalive keeps it open and re-opens it when it died
+        if (self.connection.keepalive is None and self.idle_since + 8 < time.time()) or self.force_reconnect:
+            self.connection.reconnect()
 
         remaining_response = str(response)
+        if remaining_response == "":
+            return
 
+        values = []
         i = 0
-        while not remaining_response == "":
-            if len(remaining_response) > limit:
-                response_part = remaining_response[:limit]
-                remaining_response = remaining_response[limit:]
-
-                i += 1
-                if i > 99:
-                    iteration_string = str(i)
-                elif i > 9:
-                    iteration_string = "0" + str(i)
-                else:
-                    iteration_string = "00" + str(i)
-
-                try:
-                    self.connection.set_var(
-                        f"FROM_HOST_{self.used_cloud_vars[self.current_var]}",
-                        f"{response_part}.{request_id}{iteration_string}1")
-                except Exception:
-                    self.call_event("on_disconnect")
-                self.current_var += 1
-                if self.current_var == len(self.used_cloud_vars):
-                    self.current_var = 0
-                time.sleep(0.1)
-            else:
-                try:
-                    self.connection.set_var(
-                        f"FROM_HOST_{self.used_cloud_vars[self.current_var]}",
-                        f"{remaining_response}.{request_id}{validation}")
-                except Exception:
-                    self.call_event("on_disconnect")
-                self.current_var += 1
-                if self.current_var == len(self.used_cloud_vars):
-                    self.current_var = 0
-
-                remaining_response = ""
-                time.sleep(0.1)
+        while len(remaining_response) > limit:
+            i += 1
+            values.append(f"{remaining_response[:limit]}.{request_id}{str(i).zfill(3)}1")
+            remaining_response = remaining_response[limit:]
+        values.append(f"{remaining_response}.{request_id}{validation}")
+
+        if self.transmitter is None:
+            self.transmitter = ResponseTransmitter(self.connection, self.used_cloud_vars, on_error=lambda: self.call_event("on_disconnect"))
+        self.transmitter.send(values)
 
         self.idle_since = time.time()
 
@@ -301,7 +367,9 @@ class CloudRequests:
             thread=False,
             data_from_websocket=True,
             no_packet_loss=False,
-            daemon=False):
+            daemon=False,
+            request_pool=None,
+            _events=None):
         '''
         Starts the request handler.
         
@@ -309,22 +377,31 @@ class CloudRequests:
             thread: Whether the request handler should be run in a thread.
             data_from_websocket: Whether the websocket should be used to detect requests.
             no_packet_loss: Whether the request handler should reconnect to the cloud websocket before responding to a request, this can help to avoid packet loss.
+            request_pool: (optional) A ThreadPoolDispatcher that runs the requests added with thread=True. By default, a pool with 8 worker threads is used. Use client.request_pool.stats() to get the number of running / queued requests and how long they took. The pool must be created with overflow="block", because dropped requests wouldn't get a response.
+            _events: (optional) List of cloud event handlers the requests are received from instead of the default ones (for example a ReplayCloudEvents object). Only set this argument if you know what you are doing.
         '''
+        if request_pool is not None:
+            _check_request_pool(request_pool)
+            self.request_pool = request_pool
 
         self.force_reconnect = no_packet_loss
-        if data_from_websocket is True:
-            events = [
-                cloud.WsCloudEvents(
-                    self.project_id,
-                    cloud.CloudConnection(
-                        project_id=self.project_id,
-                        username=self.connection._username,
-                        session_id=self.connection._session_id),
-                    update_interval=0),
+        if _events is not None:
+            events = list(_events)
+        elif data_from_websocket is True:
+            event_connection = cloud.CloudConnection(
+                project_id=self.project_id,
+                username=self.connection._username,
+                session_id=self.connection._session_id,
+                cloud_host=self.connection.cloud_host if self.connection.hosts is None else self.connection.hosts)
+            self._event_connections = [event_connection]
+            # the websocket provides the requests quickly, the clouddata logs catch requests the websocket missed. The merged stream passes on each request once
+            events = [MergedCloudEvents([
+                cloud.WsCloudEvents(self.project_id, event_connection, update_interval=0),
                 cloud.CloudEvents(self.project_id,
                                    update_interval=4.5,
-                                   cloud_log_limit=25)
-            ]
+                                   cloud_log_limit=25,
+                                   log_url=self.log_url)
+            ])]
         else:
             events = []
         self.cloud_events = events
@@ -345,8 +422,16 @@ class CloudRequests:
         Only works if cloud requests were run with thread=True
         """
         self.kill_signal = True
+        self._inbox.put(None)
+        for connection in self._event_connections:
+            connection.disconnect()
         for event in self.cloud_events:
             event.stop()
+        if self._owns_request_pool:
+            self.request_pool.stop()
+        self._stop_async_loop()
+        if self.transmitter is not None:
+            self.transmitter.stop()
 
     def call_event(self, event, args=[]):
         """
@@ -406,160 +491,144 @@ class CloudRequests:
             self._respond(request_id, output, self.packet_length)
 
     def _run(self, events, data_from_websocket=True):
-        self.ws_data = []
-    	
         # Prepares the cloud events:
 
         def on_set(event):
-            if event.name == "TO_HOST":
-                self.ws_data.append(event)
+            self._inbox.put(("request", event))
 
         try:
             if self.connection.is_closed:
-                self.connection._connect(cloud_host=self.connection.cloud_host)
-                self.connection._handshake()
+                self.connection.reconnect()
         except Exception:
             self.call_event("on_disconnect")
 
         self.idle_since = time.time()
-        self.responded_request_ids = []
 
         if self.requests == []:
             warnings.warn("You haven't added any requests!", RuntimeWarning)
 
-        while events != []:
-            event_handler = events.pop()
-            event_handler.event(on_set)
+        for event_handler in events:
+            event_handler.event(on_set, variables="TO_HOST")
             event_handler.start(update_interval=event_handler.update_interval,
                                 thread=True)
 
-        old_clouddata = []
         self.call_event("on_ready")  #Calls the on_ready event
 
         if data_from_websocket is False:
-            # If the data shouldn't be fetched from the cloud websocket, it prepares the cloud log events
-            old_clouddata = cloud.get_cloud_logs(self.project_id, filter_by_var_named="TO_HOST", limit=100)
-            try:
-                self.last_timestamp = old_clouddata[0]["timestamp"]
-            except Exception:
-                self.last_timestamp = 0
+            # If the data shouldn't be fetched from the cloud websocket, the cloud logs are polled in a thread
+            Thread(target=self._poll_logs, daemon=True).start()
 
+        # The main loop sleeps until a request is received or a request that was run in a thread finished
         while True:
+            item = self._inbox.get()
+            if item is None or self.kill_signal:
+                return
+            kind, data = item
+            if kind == "request":
+                self._handle_request(data)
+            elif kind == "error":
+                #Raise the exception of a request that was run in a thread (if ignore_exceptions is False)
+                self._raise(data)
+            else:
+                #Send the output of a request that was run in a thread
+                output = self.outputs.pop(data)
+                self._parse_output(output["output"], output["request"]["name"], output["request"], data)
+
+    def _poll_logs(self):
+        # Fetches the cloud logs to get the requests (used when the data shouldn't be fetched from the cloud websocket)
+        old_clouddata = cloud.get_cloud_logs(self.project_id, filter_by_var_named="TO_HOST", limit=100, log_url=self.log_url)
+        try:
+            self.last_timestamp = old_clouddata[0]["timestamp"]
+        except Exception:
+            self.last_timestamp = 0
+        polled_timestamp = self.last_timestamp
+        interval = self.update_interval
+        while not self.kill_signal:
+            time.sleep(interval)
+            clouddata = cloud.get_cloud_logs(
+                self.project_id, filter_by_var_named="TO_HOST", limit=100, log_url=self.log_url)
+            if clouddata == old_clouddata or clouddata == []:
+                # nothing changed or the logs couldn't be fetched: the logs are checked less often
+                interval = min(interval * 1.5, self.max_update_interval)
+                continue
+            interval = self.update_interval
+            old_clouddata = clouddata
+            for activity in reversed(clouddata):
+                if activity["timestamp"] > polled_timestamp:
+                    self._inbox.put(("request", cloud.CloudEvents.Event(activity["user"],
+                                             activity["name"][2:],
+                                             activity["value"],
+                                             activity["timestamp"])))
+            if clouddata != []:
+                polled_timestamp = max(polled_timestamp, clouddata[0]["timestamp"])
+
+    def _handle_request(self, event):
+        try:
+            # Parsing the received requests
+            raw_request, request_id = event.value.split(".")
 
-            time.sleep(0.001)
-            if self.kill_signal:
+            if event.value[0] == "-":
+                # => The received request is actually part of a bigger request
+                self.request_parts.add(request_id, raw_request[1:])
+                return # If the end of the request was not received yet, continue with the next received request
+
+            if not self.responded_request_ids.add(request_id):
+                # Detecting if a request with the same id was parsed before to prevent double responses
                 return
-            if data_from_websocket is False:
-                # If the data shouldn't be fetched from the cloud websocket, it fetches the cloud logs to get data
-                clouddata = cloud.get_cloud_logs(
-                    self.project_id, filter_by_var_named="TO_HOST", limit=100)
-                if clouddata == old_clouddata:
-                    continue
-                else:
-                    old_clouddata = list(clouddata)
-                self.ws_data = []
-                for activity in clouddata:
-                    if activity["timestamp"] > self.last_timestamp:
-                        self.ws_data.insert(0,cloud.CloudEvents.Event(user=activity["user"],
-                                                 var=activity["name"][2:],
-                                                 name=activity["name"][2:],
-                                                 value=activity["value"],
-                                                 timestamp=activity["timestamp"]))
-
-            current_ws_data = list(self.ws_data)
-            self.ws_data = []
-            while current_ws_data != []:
-                if self.kill_signal:
-                    return
-                event = current_ws_data.pop(0)
-
-                try:
-                    # Parsing the received requests
-                    raw_request, request_id = event.value.split(".")
-
-                    if event.value[0] == "-":
-                        # => The received request is actually part of a bigger request
-                        if not request_id in self.request_parts:
-                            self.request_parts[request_id] = []
-                        self.request_parts[request_id].append(raw_request[1:])
-                        continue # If the end of the request was not received yet, continue with the next received request
-
-                    if request_id in self.responded_request_ids:
-                        # Detecting if a request with the same id was parsed before to prevent double responses
-                        continue
-                    else:
-                        self.responded_request_ids.insert(0, request_id)
-                        self.responded_request_ids = self.responded_request_ids[:15]
-                except Exception:
-                    continue
-
-                self.last_requester = event.user
-                self.last_timestamp = event.timestamp
-
-                # If the request consists of multiple parts: Putting together the parts to get the whole raw request string
-                _raw_request = ""
-                if request_id in self.request_parts:
-                    data = self.request_parts[request_id]
-                    for i in data:
-                        _raw_request += i
-                    self.request_parts.pop(request_id)
-                raw_request = _raw_request + raw_request
-
-                # Decode request and parse arguemtns:
-                request = Encoding.decode(raw_request)
-                arguments = request.split("&")
-                request = arguments.pop(0)
-
-                # Call on_request event:
-                self.call_event("on_request", [
-                    self.Request(name=request,
-                                 request=request,
-                                 requester=self.last_requester,
-                                 timestamp=self.last_timestamp,
-                                 arguments=arguments,
-                                 request_id=request_id,
-                                 id=request_id)
-                ])
-                output = "" # initialize the output variable
-
-                # Check if the request is unknown:
-                if request not in self.requests:
-                    print(
-                        f"Warning: Client received an unknown request called '{request}'"
-                    )
-                    self.call_event("on_unknown_request", [
-                        self.Request(name=request,
-                                     request=request,
-                                     requester=self.last_requester,
-                                     timestamp=self.last_timestamp,
-                                     arguments=arguments,
-                                     request_id=request_id)
-                    ])
-                    continue
-                else:
-                    # If the request is not unknown, it is called
-                    req_obj = self.requests[request]
-                    self.last_request_id = request_id
-                    if req_obj["thread"]:
-                        # => Call request in a thread
-                        Thread(target=self.call_request,
-                               args=(request_id, req_obj, arguments)).start()
-                    else:
-                        # => Call request directly
-                        self.call_request(request_id, req_obj, arguments)
-
-            #Send outputs from request that were run in threads and still need to be returned
-            # There's still room for improvement here: While the requests that were run in threads are returned or non-threaded requests are running, no new threaded requests will be run. Will be improved in a future scratchattach version.
-            while len(list(self.outputs.keys())) > 0:
-                output_ids = list(self.outputs.keys())
-                for request_id in output_ids:
-                    if self.kill_signal:
-                        return
-                    output = self.outputs[request_id]["output"]
-                    request = self.outputs[request_id]["request"]["name"]
-                    req_obj = self.outputs[request_id]["request"]
-                    self._parse_output(output, request, req_obj, request_id)
-                    self.outputs.pop(request_id)
+        except Exception:
+            return
+
+        # passed on with the request (see call_request)
+        requester = event.user
+        timestamp = event.timestamp
+        self.last_requester = requester
+        self.last_timestamp = timestamp
+
+        # If the request consists of multiple parts: Putting together the parts to get the whole raw request string
+        raw_request = self.request_parts.pop(request_id) + raw_request
+
+        # Decode request and parse arguemtns:
+        request = Encoding.decode(raw_request)
+        arguments = request.split("&")
+        request = arguments.pop(0)
+
+        # Call on_request event:
+        self.call_event("on_request", [
+            self.Request(name=request,
+                         request=request,
+                         requester=requester,
+                         timestamp=timestamp,
+                         arguments=arguments,
+                         request_id=request_id,
+                         id=request_id)
+        ])
+
+        # Check if the request is unknown:
+        if request not in self.requests:
+            print(
+                f"Warning: Client received an unknown request called '{request}'"
+            )
+            self.call_event("on_unknown_request", [
+                self.Request(name=request,
+                             request=request,
+                             requester=requester,
+                             timestamp=timestamp,
+                             arguments=arguments,
+                             request_id=request_id)
+            ])
+        else:
+            # If the request is not unknown, it is called
+            req_obj = self.requests[request]
+            self.last_request_id = request_id
+            if req_obj["thread"]:
+                # => Call request on a worker thread of the request pool. Its output is sent by the main loop
+                if self.request_pool is None:
+                    self.request_pool = ThreadPoolDispatcher(workers=8)
+                    self._owns_request_pool = True
+                self.request_pool.submit(request, self.call_request, request_id, req_obj, arguments, requester, timestamp)
+            else:
+                # => Call request directly
+                self.call_request(request_id, req_obj, arguments, requester, timestamp)
 
 class TwCloudRequests(CloudRequests):
     """
@@ -582,6 +651,7 @@ class TwCloudRequests(CloudRequests):
         self.credit_check()
 
         self.ignore_exceptions = ignore_exceptions
+        self.log_url = "https://scratch.synt2x.xyz/logs"
         self.packet_length = _packet_length
 
         # user agent data
@@ -601,7 +671,9 @@ class TwCloudRequests(CloudRequests):
             thread=False,
             data_from_websocket=True,
             no_packet_loss=False,
-            daemon=False
+            daemon=False,
+            request_pool=None,
+            _events=None
             ):
         '''
         Starts the request handler.
@@ -610,9 +682,17 @@ class TwCloudRequests(CloudRequests):
             thread: Whether the request handler should be run in a thread.
             data_from_websocket: Whether the websocket should be used to detect requests.
             no_packet_loss: Whether the request handler should reconnect to the cloud websocket before responding to a request, this can help to avoid packet loss.
+            request_pool: (optional) A ThreadPoolDispatcher that runs the requests added with thread=True. By default, a pool with 8 worker threads is used. Use client.request_pool.stats() to get the number of running / queued requests and how long they took. The pool must be created with overflow="block", because dropped requests wouldn't get a response.
+            _events: (optional) List of cloud event handlers the requests are received from instead of the default one (for example a ReplayCloudEvents object). Only set this argument if you know what you are doing.
         '''
+        if request_pool is not None:
+            _check_request_pool(request_pool)
+            self.request_pool = request_pool
         self.force_reconnect = no_packet_loss
-        events = [cloud.TwCloudEvents(self.project_id, update_interval=0, purpose=self.purpose, contact=self.contact)]
+        if _events is not None:
+            events = list(_events)
+        else:
+            events = [cloud.TwCloudEvents(self.project_id, update_interval=0, purpose=self.purpose, contact=self.contact, cloud_host=self.connection.cloud_host if self.connection.hosts is None else self.connection.hosts)]
         self.cloud_events = events
         if thread:
             thread = Thread(target=self._run, args=[events], daemon=daemon)
@@ -0,0 +1,133 @@
+#----- Sending cloud request responses
+import time
+from collections import deque
+from threading import Thread, Condition, current_thread
+
+class ResponseTransmitter:
+    """
+    Sends the responses of a cloud request handler from a background thread. The parts of the responses are spread over all FROM_HOST variables, and when several responses are sent at the same time, their parts are interleaved, so a long response doesn't hold back the others.
+
+    The speed is limited by the rate limit of the connection and by var_interval: A FROM_HOST variable is only set again after var_interval seconds, so the Scratch project has the time to read its value.
+
+    Args:
+        connection: The CloudConnection or TwCloudConnection the responses are sent with
+        variables (list): The FROM_HOST variables that are used (without the "FROM_HOST_" prefix)
+
+    Keyword Arguments:
+        var_interval (float): Minimum time (in seconds) between two sets of the same FROM_HOST variable
+        on_error: (optional) Function that is called when a part couldn't be sent
+
+    Attributes:
+
+    :.sent: The number of sent parts
+
+    :.completed: The number of completely sent responses
+
+    :.max_concurrent: The maximum number of responses that were sent at the same time
+    """
+
+    def __init__(self, connection, variables, *, var_interval=0.1, on_error=None):
+        self.connection = connection
+        self.variables = list(variables)
+        self.var_interval = var_interval
+        self.on_error = on_error
+        self._responses = deque() # the responses that are sent, each of them is a deque of the values that still have to be set
+        self._in_flight = 0 # the number of parts that were taken from _responses and are being sent
+        self._condition = Condition()
+        self._free_at = {} # maps the FROM_HOST variables to the time they can be set again
+        self._next_variable = 0
+        self._thread = None
+        self.running = False
+        self.sent = 0
+        self.completed = 0
+        self.max_concurrent = 0
+
+    def send(self, values):
+        """
+        Queues a response and returns immediately.
+
+        Args:
+            values (list): The values the parts of the response are set to, in order
+        """
+        if len(values) == 0:
+            return
+        with self._condition:
+            self._responses.append(deque(values))
+            self.max_concurrent = max(self.max_concurrent, len(self._responses) + self._in_flight)
+            if not self.running:
+                self.running = True
+                self._thread = Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self.running and len(self._responses) == 0:
+                    self._condition.wait()
+                if not self.running:
+                    return
+                response = self._responses.popleft()
+                value = response.popleft()
+                self._in_flight += 1
+            variable = self.variables[self._next_variable]
+            self._next_variable = (self._next_variable + 1) % len(self.variables)
+            delay = self._free_at.get(variable, 0) - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                self._set_var(f"FROM_HOST_{variable}", value)
+            except Exception:
+                if self.on_error is not None:
+                    self.on_error()
+            self._free_at[variable] = time.monotonic() + self.var_interval
+            with self._condition:
+                self.sent += 1
+                self._in_flight -= 1
+                if len(response) > 0:
+                    self._responses.append(response) # round robin: the next part of this response is sent after the parts of the other responses
+                else:
+                    self.completed += 1
+                self._condition.notify_all()
+
+    def _set_var(self, variable, value):
+        # like connection.set_var, but always sent right away: the coalescing outbox of a connection created with coalesce=True would drop parts that replace each other
+        value = self.connection._check_value(value)
+        self.connection.scheduler.wait() # waits for the rate limit of the connection
+        self.connection._set_var(variable, value)
+        self.connection._notify_write({variable: value})
+
+    def flush(self, timeout=None):
+        """
+        Waits until all queued responses were sent.
+
+        Returns:
+            boolean: False if the timeout expired before that
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: len(self._responses) == 0 and self._in_flight == 0, timeout)
+
+    def stop(self):
+        """
+        Stops the transmitter and waits until its thread exited. Responses that weren't sent completely are dropped.
+        """
+        with self._condition:
+            self.running = False
+            self._responses.clear()
+            self._condition.notify_all()
+        if self._thread is not None and self._thread is not current_thread():
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        """
+        Returns:
+            dict: The number of responses that are being sent, the number of sent parts and completed responses, and the maximum number of responses that were sent at the same time
+        """
+        with self._condition:
+            return {
+                "active": len(self._responses) + self._in_flight,
+                "sent": self.sent,
+                "completed": self.completed,
+                "max_concurrent": self.max_concurrent,
+            }
@@ -0,0 +1,279 @@
+#----- Local stand-in for a cloud variable server
+import base64
+import hashlib
+import json
+import struct
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread, Lock
+from urllib.parse import urlparse, parse_qs
+
+_WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+class _Client:
+    # a websocket connection to the local cloud server
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.project_id = None
+        self.username = None
+        self.last_set = 0
+        self._send_lock = Lock()
+
+    def send_frame(self, opcode, payload):
+        header = bytes([0x80 | opcode])
+        length = len(payload)
+        if length < 126:
+            header += bytes([length])
+        elif length < 65536:
+            header += bytes([126]) + struct.pack(">H", length)
+        else:
+            header += bytes([127]) + struct.pack(">Q", length)
+        with self._send_lock:
+            self.handler.wfile.write(header + payload)
+
+    def send_text(self, text):
+        self.send_frame(0x1, text.encode("utf-8"))
+
+    def recv_frame(self):
+        rfile = self.handler.rfile
+        head = rfile.read(2)
+        if len(head) < 2:
+            return None, None
+        fin = head[0] & 0x80
+        opcode = head[0] & 0x0F
+        length = head[1] & 0x7F
+        if length == 126:
+            length = struct.unpack(">H", rfile.read(2))[0]
+        elif length == 127:
+            length = struct.unpack(">Q", rfile.read(8))[0]
+        mask = rfile.read(4) if head[1] & 0x80 else None
+        payload = rfile.read(length)
+        if mask is not None and length > 0:
+            payload = (int.from_bytes(payload, "big") ^ int.from_bytes((mask * (length // 4 + 1))[:length], "big")).to_bytes(length, "big")
+        return (opcode, fin), payload
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.headers.get("Upgrade", "").lower() == "websocket":
+            self._websocket()
+            return
+        url = urlparse(self.path)
+        if url.path.rstrip("/") != "/logs":
+            self.send_error(404)
+            return
+        query = parse_qs(url.query)
+        try:
+            project_id = query["projectid"][0]
+            limit = int(query.get("limit", ["100"])[0])
+            offset = int(query.get("offset", ["0"])[0])
+        except (KeyError, ValueError):
+            self.send_error(400)
+            return
+        body = json.dumps(self.server.cloud.get_logs(project_id, limit=limit, offset=offset)).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _websocket(self):
+        key = self.headers.get("Sec-WebSocket-Key", "")
+        accept = base64.b64encode(hashlib.sha1((key + _WEBSOCKET_GUID).encode("ascii")).digest()).decode("ascii")
+        self.send_response(101, "Switching Protocols")
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept)
+        self.end_headers()
+        self.close_connection = True
+
+        cloud = self.server.cloud
+        client = _Client(self)
+        message = b""
+        try:
+            while cloud.running:
+                frame, payload = client.recv_frame()
+                if frame is None:
+                    break
+                opcode, fin = frame
+                if opcode == 0x8: # close
+                    client.send_frame(0x8, payload[:2])
+                    break
+                if opcode == 0x9: # ping
+                    client.send_frame(0xA, payload)
+                    continue
+                if opcode not in (0x0, 0x1, 0x2):
+                    continue
+                message += payload
+                if not fin:
+                    continue
+                text = message.decode("utf-8")
+                message = b""
+                for line in text.split("\n"):
+                    if line.strip() == "":
+                        continue
+                    try:
+                        packet = json.loads(line)
+                    except ValueError:
+                        continue
+                    cloud._handle_packet(client, packet)
+        except (OSError, ValueError):
+            pass
+        finally:
+            cloud._remove_client(client)
+
+class LocalCloudServer:
+    """
+    Local stand-in for a cloud variable server, for testing and benchmarking cloud bots without connecting to Scratch's or TurboWarp's servers. It speaks the same handshake / set protocol and serves a clouddata log API that is shaped like Scratch's.
+
+    Connect to it with ``CloudConnection(..., cloud_host=server.url)`` or ``TwCloudConnection(..., cloud_host=server.url)``, and pass ``log_url=server.log_url`` to the functions and classes that read the clouddata logs.
+
+    Keyword Arguments:
+        host (str): The host the server listens on
+        port (int): The port the server listens on. If this is 0, a free port is chosen.
+        ratelimit (float): Minimum time (in seconds) between two sets of one connection. Sets that arrive faster are dropped, like on Scratch's cloud server. 0 disables the rate limit.
+        send_snapshot (boolean): Whether the current values of all cloud variables are sent after the handshake (like TurboWarp's cloud server does)
+        echo (boolean): Whether sets are also sent back to the connection that made them
+        log_limit (int): How many entries are kept in the clouddata log of each project
+
+    Attributes:
+
+    :.url: The websocket URL of the server
+
+    :.log_url: The URL of the clouddata log API of the server
+
+    :.variables: Dict that maps the project ids to dicts with the values of the projects' cloud variables
+    """
+
+    def __init__(self, *, host="127.0.0.1", port=0, ratelimit=0, send_snapshot=True, echo=False, log_limit=1000):
+        self.ratelimit = ratelimit
+        self.send_snapshot = send_snapshot
+        self.echo = echo
+        self.log_limit = log_limit
+        self.variables = {}
+        self._logs = {}
+        self._rooms = {}
+        self._lock = Lock()
+        self.running = False
+        self._thread = None
+
+        self.sets_received = 0
+        self.sets_dropped = 0
+        self.messages_sent = 0
+
+        self._httpd = ThreadingHTTPServer((host, port), _RequestHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.cloud = self
+        self.host, self.port = self._httpd.server_address[:2]
+        self.url = f"ws://{self.host}:{self.port}"
+        self.log_url = f"http://{self.host}:{self.port}/logs"
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        """
+        Starts the server in a background thread.
+        """
+        if self.running is False:
+            self.running = True
+            self._thread = Thread(target=self._httpd.serve_forever, kwargs={"poll_interval": 0.1}, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stops the server and closes all connections.
+        """
+        if self.running:
+            self.running = False
+            self._httpd.shutdown()
+            with self._lock:
+                clients = [client for room in self._rooms.values() for client in room]
+                self._rooms = {}
+            for client in clients:
+                try:
+                    client.send_frame(0x8, b"")
+                except OSError:
+                    pass
+            self._httpd.server_close()
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        """
+        Returns:
+            dict: The number of open connections, received / dropped sets and sent messages
+        """
+        with self._lock:
+            return {
+                "connections": sum(len(room) for room in self._rooms.values()),
+                "sets_received": self.sets_received,
+                "sets_dropped": self.sets_dropped,
+                "messages_sent": self.messages_sent,
+            }
+
+    def get_logs(self, project_id, *, limit=100, offset=0):
+        """
+        Returns the clouddata log of a project (newest entries first), in the same format as :meth:`scratchattach.cloud.get_cloud_logs`.
+        """
+        with self._lock:
+            log = self._logs.get(str(project_id))
+            if log is None:
+                return []
+            return list(reversed(log))[offset:offset + limit]
+
+    def _handle_packet(self, client, packet):
+        method = packet.get("method")
+        if method == "handshake":
+            project_id = str(packet.get("project_id"))
+            with self._lock:
+                if client.project_id is not None:
+                    self._rooms[client.project_id].discard(client)
+                client.project_id = project_id
+                client.username = packet.get("user")
+                self._rooms.setdefault(project_id, set()).add(client)
+                snapshot = dict(self.variables.get(project_id, {}))
+            if self.send_snapshot and snapshot != {}:
+                client.send_text("\n".join(json.dumps({"method": "set", "name": name, "value": value}) for name, value in snapshot.items()))
+                with self._lock:
+                    self.messages_sent += 1
+        elif method == "set" and client.project_id is not None:
+            now = time.time()
+            with self._lock:
+                self.sets_received += 1
+                if self.ratelimit > 0 and now - client.last_set < self.ratelimit:
+                    self.sets_dropped += 1
+                    return
+                client.last_set = now
+                name = packet.get("name")
+                value = packet.get("value")
+                self.variables.setdefault(client.project_id, {})[name] = value
+                self._logs.setdefault(client.project_id, deque(maxlen=self.log_limit)).append(
+                    {"user": packet.get("user", client.username), "verb": "set_var", "name": name, "value": value, "timestamp": int(now * 1000)}
+                )
+                receivers = [other for other in self._rooms.get(client.project_id, ()) if self.echo or other is not client]
+            text = json.dumps({"method": "set", "name": name, "value": value})
+            sent = 0
+            for other in receivers:
+                try:
+                    other.send_text(text)
+                    sent += 1
+                except OSError:
+                    pass
+            with self._lock:
+                self.messages_sent += sent
+
+    def _remove_client(self, client):
+        with self._lock:
+            if client.project_id is not None and client.project_id in self._rooms:
+                self._rooms[client.project_id].discard(client)
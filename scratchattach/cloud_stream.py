@@ -0,0 +1,150 @@
+#----- Merging the cloud activity received from several sources
+import time
+from collections import deque
+from threading import Lock
+
+class MergedCloudEvents:
+    """
+    Merges the cloud activity of several cloud event handlers (usually a WsCloudEvents object for low latency and a CloudEvents object, which reads the clouddata logs and knows who made the changes) into one stream that calls each event once per logical update.
+
+    An update received from one source is passed on right away and remembered for ``window`` seconds. When the same update (same action, variable and value) arrives from another source in that time, it isn't passed on again. Every passed on event gets a sequence number (event.seq).
+
+    Updates received from the websocket come first and don't contain the user who made them, so their events are called with event.user set to None. The user is backfilled later: When the duplicate arrives from the clouddata logs, the user is filled into the Event object that was already passed on, so it's available to code that keeps the Event object (for example after a slow request finished). Code that needs the user right away has to read it from the clouddata logs itself (like :meth:`scratchattach.cloud_requests.CloudRequests.get_requester` does).
+
+    Args:
+        sources (list): The cloud event handlers whose activity is merged. They must not be started: The merged stream starts them.
+
+    Keyword Arguments:
+        window (float): How long (in seconds) an update is remembered for detecting its duplicates. Should be longer than the update interval of the clouddata log handler.
+        max_entries (int): Maximum number of remembered updates. If there are more, the oldest ones are forgotten.
+
+    Attributes:
+
+    :.sequence: The sequence number of the last passed on event
+
+    :.duplicates: The number of updates that weren't passed on because they were received before
+
+    :.users_filled: The number of passed on events whose user was filled in from the clouddata logs
+    """
+
+    def __init__(self, sources, *, window=30, max_entries=10000):
+        self.sources = list(sources)
+        self.window = window
+        self.max_entries = max_entries
+        self._events = {}
+        self._index = {} # maps (action, variable, value) to a deque of [receive time, event, source, key, remembered] entries that weren't matched by another source yet
+        self._order = deque() # all entries in the order they were received, for the expiry. Entries that were matched are skipped
+        self._size = 0
+        self._lock = Lock()
+        self.sequence = 0
+        self.duplicates = 0
+        self.users_filled = 0
+        self.running = False
+        self.update_interval = None
+
+    def event(self, function=None, *, variables=None):
+        """
+        Decorator function. Adds a cloud event to the merged stream (see :meth:`scratchattach.cloud.CloudEvents.event`).
+        """
+        if function is None:
+            return lambda function: self.event(function, variables=variables)
+        self._events[function.__name__] = function
+        if function.__name__ not in ("on_ready", "on_disconnect"):
+            for source in self.sources:
+                source.event(self._relay(function.__name__, source), variables=variables)
+        elif function.__name__ == "on_disconnect":
+            for source in self.sources:
+                source.event(function)
+        return function
+
+    def _relay(self, event_name, source):
+        # returns the event that is added to a source, it passes the source's events to the merge
+        def relay(event):
+            self._receive(event_name, event, source)
+        relay.__name__ = event_name
+        return relay
+
+    def _forget(self, key, entries):
+        entry = entries.popleft()
+        entry[4] = False
+        self._size -= 1
+        if len(entries) == 0:
+            del self._index[key]
+
+    def _expire(self, now):
+        # removes the remembered updates that are older than the window or exceed max_entries, checking the age of each entry
+        while len(self._order) > 0:
+            entry = self._order[0]
+            if entry[4] and entry[0] > now - self.window and self._size < self.max_entries:
+                return
+            self._order.popleft()
+            if entry[4]:
+                # the entries of a key are received in order, so the oldest remembered entry is the first one of its key
+                self._forget(entry[3], self._index[entry[3]])
+
+    def _receive(self, event_name, event, source):
+        now = time.monotonic()
+        key = (event_name, event.var, str(event.value)) # the websocket may provide numbers where the logs provide strings
+        with self._lock:
+            self._expire(now)
+            entries = self._index.get(key)
+            if entries is not None and entries[0][2] is not source:
+                # the update was already passed on when it was received from another source
+                emitted = entries[0][1]
+                self._forget(key, entries)
+                self.duplicates += 1
+                if emitted.user is None and event.user is not None:
+                    emitted.user = event.user
+                    self.users_filled += 1
+                return
+            if entries is None:
+                entries = self._index[key] = deque()
+            entry = [now, event, source, key, True]
+            entries.append(entry)
+            self._order.append(entry)
+            self._size += 1
+            self.sequence += 1
+            event.seq = self.sequence
+            handler = self._events.get(event_name)
+        # the event is called without holding the lock, so a slow event doesn't hold back the other sources
+        if handler is not None:
+            handler(event)
+
+    def start(self, *, update_interval=None, thread=True):
+        """
+        Starts the sources (each of them in a thread) and calls the on_ready event.
+
+        Keyword Arguments:
+            update_interval: Ignored, the sources are started with their own update intervals
+            thread (boolean): If this is False, this method blocks until the merged stream is stopped.
+        """
+        if self.running is False:
+            self.running = True
+            for source in self.sources:
+                source.start(update_interval=getattr(source, "update_interval", 0.1), thread=True)
+            if "on_ready" in self._events:
+                self._events["on_ready"]()
+            if not thread:
+                while self.running:
+                    time.sleep(0.5)
+
+    def stop(self):
+        """
+        Permanently stops the merged stream and its sources.
+        """
+        self.running = False
+        for source in self.sources:
+            source.stop()
+
+    def stats(self):
+        """
+        Returns:
+            dict: The sequence number and the numbers of duplicates, filled in users and remembered updates
+        """
+        with self._lock:
+            return {
+                "sequence": self.sequence,
+                "duplicates": self.duplicates,
+                "users_filled": self.users_filled,
+                "remembered": self._size,
+            }
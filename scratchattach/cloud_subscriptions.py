@@ -0,0 +1,100 @@
+#----- Subscriptions to cloud variables
+from fnmatch import fnmatchcase
+from threading import Lock
+
+def _is_pattern(variable):
+    return "*" in variable or "?" in variable or "[" in variable
+
+class VariableFilter:
+    """
+    Matches cloud variable names against a list of exact names and glob patterns (like "FROM_HOST_*").
+
+    Args:
+        variables (str or list): A name / pattern or a list of names and patterns (provided without the cloud emoji)
+    """
+
+    def __init__(self, variables):
+        if isinstance(variables, str):
+            variables = [variables]
+        self.exact = set()
+        self.patterns = []
+        for variable in variables:
+            variable = variable.replace("☁ ", "")
+            if _is_pattern(variable):
+                self.patterns.append(variable)
+            else:
+                self.exact.add(variable)
+        self.matches_all = "*" in self.patterns
+
+    def matches(self, variable):
+        """
+        Args:
+            variable (str): The name of the cloud variable (without the cloud emoji), or None for packets that don't belong to a variable
+
+        Returns:
+            boolean: Whether the variable is matched by the filter. Packets that don't belong to a variable are only matched by "*".
+        """
+        if self.matches_all:
+            return True
+        if variable is None:
+            return False
+        if variable in self.exact:
+            return True
+        for pattern in self.patterns:
+            if fnmatchcase(variable, pattern):
+                return True
+        return False
+
+class SubscriptionRegistry:
+    """
+    Maps cloud variables to the callbacks that are subscribed to them. The callbacks subscribed to a variable are looked up once per variable name and then cached, so packets of variables nobody subscribed to are skipped with one dict lookup.
+
+    The variable names passed to :meth:`match` are the raw names from the packets (with the cloud emoji).
+    """
+
+    _max_cache_size = 4096
+
+    def __init__(self):
+        self._subscriptions = [] # (VariableFilter, callback) pairs
+        self._cache = {}
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+    def add(self, variables, callback):
+        """
+        Subscribes a callback to cloud variables.
+
+        Args:
+            variables (str or list): Names and / or glob patterns of the cloud variables ("*" subscribes to all packets)
+            callback: Function that is called with the packets (dicts) of the subscribed variables
+        """
+        with self._lock:
+            self._subscriptions = self._subscriptions + [(VariableFilter(variables), callback)]
+            self._cache = {}
+
+    def remove(self, callback):
+        """
+        Removes all subscriptions of a callback.
+        """
+        with self._lock:
+            self._subscriptions = [subscription for subscription in self._subscriptions if subscription[1] != callback]
+            self._cache = {}
+
+    def match(self, raw_name):
+        """
+        Returns:
+            tuple: The callbacks subscribed to the cloud variable with the given raw name (None for packets that don't belong to a variable)
+        """
+        try:
+            return self._cache[raw_name]
+        except KeyError:
+            pass
+        variable = None if raw_name is None else raw_name[2:]
+        callbacks = tuple(callback for variable_filter, callback in self._subscriptions if variable_filter.matches(variable))
+        cache = self._cache
+        if len(cache) >= self._max_cache_size:
+            cache.clear()
+        cache[raw_name] = callbacks
+        return callbacks
@@ -0,0 +1,98 @@
+#----- Choosing between several cloud servers
+import time
+from threading import Lock
+
+class HostPool:
+    """
+    Keeps track of the health of several cloud servers that serve the same projects (for example the nodes of a self-hosted cloud server) and decides which one a connection should use.
+
+    Each host gets a score from its connect latency and its error rate (both exponentially weighted moving averages). Connections try the hosts in the order of their scores. Hosts with equal scores (and hosts that weren't connected to yet) are tried in the order they were provided in, so the first host is preferred while it's healthy. A host that failed recently is only tried after all other hosts.
+
+    A HostPool can be passed as cloud_host to several CloudConnection / TwCloudConnection / TwCloudEvents objects, so they share the health information.
+
+    Args:
+        hosts (list): The websocket URLs of the cloud servers, the preferred one first
+
+    Keyword Arguments:
+        smoothing (float): How much the newest measurement counts in the moving averages (between 0 and 1)
+        error_weight (float): How strongly the error rate increases the score: The score is the latency multiplied by 1 + error_weight * error rate
+        cooldown (float): How long (in seconds) a host that failed is only tried after the other hosts
+    """
+
+    def __init__(self, hosts, *, smoothing=0.3, error_weight=4, cooldown=30):
+        if isinstance(hosts, str):
+            hosts = [hosts]
+        self.hosts = list(hosts)
+        if self.hosts == []:
+            raise ValueError("At least one host is required")
+        self.smoothing = smoothing
+        self.error_weight = error_weight
+        self.cooldown = cooldown
+        self._lock = Lock()
+        self._health = {host: {"latency": None, "error_rate": 0.0, "connects": 0, "failures": 0, "failed_at": None} for host in self.hosts}
+
+    def _average(self, old, new):
+        return new if old is None else old + self.smoothing * (new - old)
+
+    def _score(self, health, default):
+        latency = default if health["latency"] is None else health["latency"]
+        return latency * (1 + self.error_weight * health["error_rate"])
+
+    def ordered(self):
+        """
+        Returns:
+            list: The hosts in the order they should be tried in
+        """
+        now = time.monotonic()
+        with self._lock:
+            known = [health["latency"] for health in self._health.values() if health["latency"] is not None]
+            default = min(known) if known != [] else 0 # hosts without measurements are treated like the fastest host, so the host order decides
+            keys = {}
+            for index, host in enumerate(self.hosts):
+                health = self._health[host]
+                cooling_down = health["failed_at"] is not None and now - health["failed_at"] < self.cooldown
+                keys[host] = (cooling_down, self._score(health, default), index)
+        return sorted(self.hosts, key=keys.__getitem__)
+
+    def record_success(self, host, latency):
+        """
+        Records a successful connect to a host.
+
+        Args:
+            host (str): The websocket URL of the host
+            latency (float): How long (in seconds) the connect took
+        """
+        with self._lock:
+            health = self._health[host]
+            health["latency"] = self._average(health["latency"], latency)
+            health["error_rate"] = self._average(health["error_rate"], 0.0)
+            health["connects"] += 1
+            health["failed_at"] = None
+
+    def record_failure(self, host):
+        """
+        Records a failed connect to a host or a lost connection to it.
+        """
+        with self._lock:
+            health = self._health.get(host)
+            if health is None:
+                return
+            health["error_rate"] = self._average(health["error_rate"], 1.0)
+            health["failures"] += 1
+            health["failed_at"] = time.monotonic()
+
+    def stats(self):
+        """
+        Returns:
+            dict: Maps the hosts to their connect latency (in milliseconds, None if there was no successful connect yet), error rate and numbers of connects and failures
+        """
+        with self._lock:
+            return {
+                host: {
+                    "latency_ms": None if health["latency"] is None else health["latency"] * 1000,
+                    "error_rate": health["error_rate"],
+                    "connects": health["connects"],
+                    "failures": health["failures"],
+                }
+                for host, health in self._health.items()
+            }
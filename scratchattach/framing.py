@@ -0,0 +1,131 @@
+#----- Parsing the messages received from cloud websockets
+import json
+
+try:
+    import orjson as _orjson
+except ImportError: # orjson is optional, it only makes parsing faster
+    _orjson = None
+
+if _orjson is None:
+    def _loads(data):
+        if isinstance(data, (bytes, bytearray)):
+            data = data.decode("utf-8")
+        return json.loads(data)
+else:
+    _loads = _orjson.loads
+
+class NDJSONFramer:
+    """
+    Incremental parser for the newline-delimited JSON messages sent by cloud servers (one packet per line, several packets per websocket message).
+
+    Messages that only contain one packet are parsed without splitting them. If the last line of a message can't be parsed and the message doesn't end with a newline, the line is kept and completed with the start of the next message, so packets that are split across messages aren't lost. Uses orjson to parse the packets if it is installed.
+
+    Keyword Arguments:
+        max_partial (int): Maximum length of an incomplete line that is kept until the next message. Longer incomplete lines are dropped.
+
+    Attributes:
+
+    :.packets: The number of packets parsed so far
+
+    :.errors: The number of lines that were dropped because they couldn't be parsed
+    """
+
+    def __init__(self, *, max_partial=65536):
+        self.max_partial = max_partial
+        self.packets = 0
+        self.errors = 0
+        self._partial = None
+
+    def feed(self, message):
+        """
+        Parses a message received from a cloud websocket.
+
+        Args:
+            message (str or bytes): The received message
+
+        Returns:
+            list: The parsed packets (dicts), in the order they were received
+        """
+        if isinstance(message, (bytes, bytearray)):
+            newline = b"\n"
+        else:
+            newline = "\n"
+        packets = []
+        if self._partial is not None:
+            message = self._complete_partial(message, newline, packets)
+
+        if newline not in message:
+            # fast path: most messages contain exactly one packet
+            if message:
+                self._parse_last(message, packets)
+            return packets
+
+        start = 0
+        length = len(message)
+        while start < length:
+            end = message.find(newline, start)
+            if end == -1:
+                self._parse_last(message[start:], packets)
+                break
+            if end > start:
+                self._parse(message[start:end], packets)
+            start = end + 1
+        return packets
+
+    def _parse(self, line, packets):
+        try:
+            packet = _loads(line)
+        except ValueError:
+            if line.strip() != "" and line.strip() != b"":
+                self.errors += 1
+            return
+        if isinstance(packet, dict):
+            packets.append(packet)
+            self.packets += 1
+
+    def _parse_last(self, line, packets):
+        # the last line of a message may be the first part of a packet that is continued in the next message
+        try:
+            packet = _loads(line)
+        except ValueError:
+            if len(line) <= self.max_partial and line.strip() not in ("", b""):
+                self._partial = line
+            elif line.strip() not in ("", b""):
+                self.errors += 1
+            return
+        if isinstance(packet, dict):
+            packets.append(packet)
+            self.packets += 1
+
+    def _complete_partial(self, message, newline, packets):
+        # joins the kept incomplete line with the first line of the message. If that doesn't give a valid packet, the kept line is dropped and the message is parsed on its own
+        partial = self._partial
+        self._partial = None
+        if isinstance(partial, str) and newline == b"\n":
+            partial = partial.encode("utf-8")
+        elif isinstance(partial, bytes) and newline == "\n":
+            partial = partial.decode("utf-8")
+        end = message.find(newline)
+        first_line = message if end == -1 else message[:end]
+        try:
+            packet = _loads(partial + first_line)
+        except ValueError:
+            try:
+                complete = isinstance(_loads(first_line), dict)
+            except ValueError:
+                complete = False
+            if not complete and end == -1 and len(partial) + len(first_line) <= self.max_partial:
+                self._partial = partial + first_line # still incomplete
+                return message[:0]
+            self.errors += 1
+            return message
+        if isinstance(packet, dict):
+            packets.append(packet)
+            self.packets += 1
+        return message[:0] if end == -1 else message[end + 1:]
+
+    def reset(self):
+        """
+        Drops the incomplete line that is kept from the last message (for example after reconnecting).
+        """
+        self._partial = None
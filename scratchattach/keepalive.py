@@ -0,0 +1,175 @@
+#----- Keepalive pings for cloud connections
+import itertools
+import math
+import select
+import time
+from collections import deque
+from threading import Thread, Event, Lock, current_thread
+from . import exceptions
+
+def percentile(ordered, p):
+    """
+    Returns the p-th percentile (0-100) of a sorted, non-empty list, using the nearest-rank method: the smallest value that at least p percent of the values are less than or equal to.
+    """
+    index = max(0, min(len(ordered) - 1, math.ceil(p * len(ordered) / 100) - 1))
+    return ordered[index]
+
+class Keepalive:
+    """
+    Sends websocket pings over a cloud connection from a background thread. This keeps idle connections open, measures the round-trip time to the cloud server and detects dead connections early: If a ping isn't answered within the timeout, the connection is re-opened (following the connection's reconnect policy).
+
+    The pongs are received by whoever reads the connection (a cloud event handler or a CloudHub). If nobody reads the connection, the keepalive thread reads it itself. The messages it receives that way are kept and returned by the next ``conn.recv()`` calls.
+
+    A new ping is only sent after the last one was answered (or timed out).
+
+    Don't create Keepalive objects directly, use ``conn.start_keepalive()``.
+
+    Attributes:
+
+    :.pings: The number of sent pings
+
+    :.pongs: The number of received pongs
+
+    :.dead: How often the connection was found to be dead (and re-opened)
+    """
+
+    def __init__(self, connection, *, interval=10, timeout=None, history=100):
+        self.connection = connection
+        self.interval = interval
+        self.timeout = interval / 2 if timeout is None else timeout
+        self._rtts = deque(maxlen=history)
+        self._counter = itertools.count()
+        self._outstanding = None # (payload, send time, connection generation) of the ping that wasn't answered yet
+        self._lock = Lock()
+        self._wakeup = Event()
+        self._thread = None
+        self.running = False
+        self.pings = 0
+        self.pongs = 0
+        self.dead = 0
+        self.last_pong = None
+
+    def start(self):
+        if self.running is False:
+            self.running = True
+            self._wakeup.clear()
+            self._thread = Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stops sending pings.
+        """
+        self.running = False
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not current_thread():
+            self._thread.join()
+            self._thread = None
+
+    def _on_pong(self, payload):
+        # called by the readers of the connection when a pong frame was received
+        now = time.perf_counter()
+        with self._lock:
+            self.pongs += 1
+            self.last_pong = time.time()
+            if self._outstanding is not None and self._outstanding[0] == payload:
+                self._rtts.append(now - self._outstanding[1])
+                self._outstanding = None
+
+    def _ping(self):
+        payload = str(next(self._counter)).encode("ascii")
+        generation = self.connection._generation
+        with self._lock:
+            self._outstanding = (payload, time.perf_counter(), generation)
+            self.pings += 1
+        try:
+            self.connection.websocket.ping(payload)
+        except Exception:
+            self._reconnect(generation)
+
+    def _reconnect(self, generation):
+        with self._lock:
+            self._outstanding = None
+            self.dead += 1
+        try:
+            self.connection._reconnect(generation)
+        except exceptions.ConnectionError:
+            pass
+
+    def _read(self, wait):
+        # reads the connection for at most `wait` seconds if nobody else does, so the pongs are received
+        ws = self.connection.websocket
+        sock = ws.sock
+        if sock is None:
+            self._wakeup.wait(wait)
+            return
+        pending = getattr(sock, "pending", None)
+        if pending is None or pending() == 0:
+            try:
+                readable, _, _ = select.select([sock], [], [], wait)
+            except (OSError, ValueError):
+                self._wakeup.wait(wait)
+                return
+            if readable == []:
+                return
+        if len(self.connection._readers) > 0 or not ws.readlock.acquire(blocking=False):
+            self._wakeup.wait(wait)
+            return
+        generation = self.connection._generation
+        try:
+            opcode, frame = ws.recv_data_frame(True)
+            message = self.connection._on_frame(opcode, frame)
+            if message is not None:
+                self.connection._backlog.append(message)
+        except Exception:
+            if self.running and not self.connection.is_closed:
+                ws.readlock.release()
+                self._reconnect(generation)
+                return
+        ws.readlock.release()
+
+    def _run(self):
+        while self.running:
+            if not self.connection.is_closed and self._outstanding is None:
+                self._ping()
+            deadline = time.perf_counter() + self.interval
+            while self.running:
+                # the timeout is checked before the deadline, so a ping that wasn't answered until the next one is due is detected
+                outstanding = self._outstanding
+                now = time.perf_counter()
+                if outstanding is not None and now - outstanding[1] >= self.timeout:
+                    if not self.connection.is_closed:
+                        self._reconnect(outstanding[2])
+                    else:
+                        with self._lock:
+                            self._outstanding = None
+                    break
+                remaining = deadline - now
+                if remaining <= 0:
+                    break
+                wait = min(remaining, 0.5)
+                if outstanding is not None:
+                    wait = min(wait, outstanding[1] + self.timeout - now)
+                if len(self.connection._readers) == 0 and not self.connection.is_closed:
+                    self._read(wait)
+                else:
+                    self._wakeup.wait(wait)
+
+    def stats(self):
+        """
+        Returns:
+            dict: The numbers of pings, pongs and dead connections, and the round-trip times of the last pings in milliseconds (p50, p90, p99, max)
+        """
+        with self._lock:
+            rtts = sorted(rtt * 1000 for rtt in self._rtts)
+            result = {"pings": self.pings, "pongs": self.pongs, "dead": self.dead, "last_pong": self.last_pong}
+        if rtts == []:
+            result["rtt_ms"] = None
+        else:
+            result["rtt_ms"] = {
+                "p50": percentile(rtts, 50),
+                "p90": percentile(rtts, 90),
+                "p99": percentile(rtts, 99),
+                "max": rtts[-1],
+            }
+        return result
@@ -0,0 +1,233 @@
+#----- Rate limiting for outgoing cloud packets
+import asyncio
+import time
+import traceback
+from collections import OrderedDict
+from threading import Condition, Lock, Thread
+
+class TokenBucket:
+    """
+    Token bucket that allows one action per interval, with bursts of up to ``burst`` actions after an idle period.
+
+    Callers don't poll the bucket. Instead, they reserve tokens and get back how long they have to wait before they may act. If the bucket is empty, the token count goes negative, so waiting callers are served in the order they made their reservations.
+    """
+
+    def __init__(self, interval, *, burst=1):
+        self.interval = interval
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = Lock()
+
+    def _refill(self, now):
+        if self.interval > 0:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) / self.interval)
+        else:
+            self._tokens = self.burst
+        self._updated = now
+
+    def reserve(self, amount=1):
+        """
+        Takes tokens from the bucket. If more than one token is taken, the actions may be performed as a burst as soon as the first token is available. The remaining tokens are taken from the bucket anyway, so the following callers wait longer and the average rate is kept.
+
+        Args:
+            amount (int): The number of tokens that should be taken
+
+        Returns:
+            float: The time (in seconds) the caller has to wait before it may perform the action(s)
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            available = self._tokens
+            self._tokens -= amount
+            if available >= 1:
+                return 0
+            return (1 - available) * self.interval
+
+class SendScheduler:
+    """
+    Outbound scheduler of a cloud connection. Makes the senders sleep (or await) until the rate limit of the cloud server allows sending, instead of busy-waiting.
+
+    Attributes:
+
+    :.bucket: The TokenBucket used by the scheduler
+
+    :.queue_depth: The number of senders currently waiting for their turn
+
+    :.max_queue_depth: The highest queue depth seen so far
+
+    :.sent: The number of packets that were scheduled
+
+    :.delayed: The number of packets that had to wait because of the rate limit
+
+    :.total_wait_time: The total time (in seconds) the senders spent waiting
+
+    :.max_wait_time: The longest time (in seconds) a sender had to wait
+    """
+
+    def __init__(self, interval, *, burst=1):
+        self.bucket = TokenBucket(interval, burst=burst)
+        self._lock = Lock()
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.sent = 0
+        self.delayed = 0
+        self.total_wait_time = 0
+        self.max_wait_time = 0
+
+    def _enter(self, amount):
+        with self._lock:
+            self.queue_depth += amount
+            if self.queue_depth > self.max_queue_depth:
+                self.max_queue_depth = self.queue_depth
+        return self.bucket.reserve(amount)
+
+    def _leave(self, amount, wait_time):
+        with self._lock:
+            self.queue_depth -= amount
+            self.sent += amount
+            if wait_time > 0:
+                self.delayed += amount
+                self.total_wait_time += wait_time
+                if wait_time > self.max_wait_time:
+                    self.max_wait_time = wait_time
+
+    def wait(self, amount=1):
+        """
+        Blocks the calling thread until ``amount`` packets may be sent (as a burst if ``amount`` is more than 1).
+        """
+        wait_time = self._enter(amount)
+        try:
+            if wait_time > 0:
+                time.sleep(wait_time)
+        finally:
+            self._leave(amount, wait_time)
+
+    async def wait_async(self, amount=1):
+        """
+        Waits without blocking the event loop until ``amount`` packets may be sent (as a burst if ``amount`` is more than 1).
+        """
+        wait_time = self._enter(amount)
+        try:
+            if wait_time > 0:
+                await asyncio.sleep(wait_time)
+        finally:
+            self._leave(amount, wait_time)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Queue depth and wait time statistics of the scheduler. If "average_wait_time" is close to the rate limit interval, the connection is rate-bound.
+        """
+        with self._lock:
+            return {
+                "interval": self.bucket.interval,
+                "queue_depth": self.queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "sent": self.sent,
+                "delayed": self.delayed,
+                "total_wait_time": self.total_wait_time,
+                "max_wait_time": self.max_wait_time,
+                "average_wait_time": self.total_wait_time / self.sent if self.sent > 0 else 0,
+            }
+
+class CoalescingQueue:
+    """
+    Last-write-wins outbound queue for cloud variable sets. Only the latest pending value of each cloud variable is kept. The pending variables are sent by a background thread in round-robin order (a variable that is set again while it's pending keeps its place in the queue), so a frequently updated variable can't starve the others.
+
+    Attributes:
+
+    :.coalesced: The number of stale values that were replaced before they were sent
+
+    :.sent: The number of values that were sent
+    """
+
+    def __init__(self, scheduler, send):
+        self._scheduler = scheduler
+        self._send = send # called with (variable, value) once the rate limit allows it
+        self._pending = OrderedDict()
+        self._condition = Condition()
+        self._in_flight = False
+        self._thread = None
+        self.running = False
+        self.coalesced = 0
+        self.sent = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def put(self, variable, value):
+        """
+        Queues a cloud variable set. If a value for the variable is already pending, it is replaced.
+        """
+        with self._condition:
+            if variable in self._pending:
+                self.coalesced += 1
+            self._pending[variable] = value
+            if not self.running:
+                self.running = True
+                self._thread = Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and self.running:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+            # the value is only taken from the queue after the wait, so writes that arrive in the meantime still replace it
+            self._scheduler.wait()
+            with self._condition:
+                variable, value = self._pending.popitem(last=False)
+                self._in_flight = True
+            sent = False
+            try:
+                self._send(variable, value)
+                sent = True
+            except Exception as e:
+                print(f"Warning: Caught error while setting cloud variable '{variable}' - Full error below")
+                try:
+                    traceback.print_exc()
+                except Exception:
+                    print(e)
+            finally:
+                with self._condition:
+                    if sent:
+                        self.sent += 1
+                    self._in_flight = False
+                    self._condition.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        Blocks until all pending values were sent.
+
+        Returns:
+            boolean: False if the timeout expired before the queue was empty, else True
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._pending and not self._in_flight, timeout)
+
+    def stop(self):
+        """
+        Sends the values that are still pending, then stops the background thread.
+        """
+        with self._condition:
+            self.running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        """
+        Returns:
+            dict: The number of pending, coalesced and sent values
+        """
+        with self._condition:
+            return {
+                "pending": len(self._pending),
+                "coalesced": self.coalesced,
+                "sent": self.sent,
+            }
@@ -0,0 +1,142 @@
+#----- Reconnect policy for cloud connections
+import asyncio
+import random
+import time
+from threading import Lock
+from . import exceptions
+
+class ReconnectPolicy:
+    """
+    Decides when a lost cloud connection is re-opened. Failed attempts are retried with exponential backoff and random jitter. After max_attempts consecutive failures, the circuit breaker opens: Further reconnects fail immediately (raising a ConnectionError) until the cooldown has passed, then one attempt is let through again.
+
+    Keyword Arguments:
+        initial_delay (float): The delay (in seconds) before the second attempt. The first attempt is made right away.
+        max_delay (float): The maximum delay between two attempts
+        multiplier (float): The factor the delay is multiplied with after every failed attempt
+        jitter (float): The delay is randomly shortened by up to this fraction, so many clients don't reconnect at the same time
+        max_attempts (int): The number of consecutive failed attempts after which the circuit breaker opens
+        cooldown (float): How long (in seconds) the circuit breaker stays open
+
+    Attributes:
+
+    :.state: "closed" (reconnects are attempted), "open" (reconnects fail immediately) or "half-open" (the cooldown has passed, the next attempt decides whether the circuit closes again)
+
+    :.failures: The number of consecutive failed attempts
+
+    :.reconnects: The number of successful reconnects
+
+    :.failed_attempts: The total number of failed attempts
+    """
+
+    def __init__(self, *, initial_delay=0.1, max_delay=30, multiplier=2, jitter=0.5, max_attempts=10, cooldown=60):
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.max_attempts = max_attempts
+        self.cooldown = cooldown
+        self.failures = 0
+        self.reconnects = 0
+        self.failed_attempts = 0
+        self._opened_at = None
+        self._lock = Lock()
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.cooldown:
+            return "open"
+        return "half-open"
+
+    def next_delay(self):
+        """
+        Returns:
+            float: How long (in seconds) to wait before the next attempt. If the circuit breaker is open, this is the remaining cooldown.
+        """
+        if self._opened_at is not None:
+            return max(0, self._opened_at + self.cooldown - time.monotonic())
+        if self.failures == 0:
+            return 0
+        delay = min(self.initial_delay * self.multiplier ** (self.failures - 1), self.max_delay)
+        return delay * (1 - self.jitter * random.random())
+
+    def _before_attempt(self):
+        if self.state == "open":
+            raise exceptions.ConnectionError(f"Not reconnecting: The last {self.failures} attempts failed (retrying in {self.next_delay():.1f}s)")
+
+    def _succeeded(self):
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+            self.reconnects += 1
+
+    def _failed(self):
+        with self._lock:
+            self.failures += 1
+            self.failed_attempts += 1
+            if self.failures >= self.max_attempts:
+                self._opened_at = time.monotonic()
+
+    def attempt(self, reopen):
+        """
+        Makes one reconnect attempt without waiting.
+
+        Args:
+            reopen: Function that re-opens the connection and performs the handshake. It raises an exception if this fails.
+
+        Raises:
+            scratchattach.exceptions.ConnectionError: The attempt failed or the circuit breaker is open
+        """
+        self._before_attempt()
+        try:
+            reopen()
+        except Exception as e:
+            self._failed()
+            raise exceptions.ConnectionError("Reconnecting to the cloud server failed.", str(e))
+        self._succeeded()
+
+    def run(self, reopen):
+        """
+        Makes reconnect attempts (sleeping between them) until one succeeds or the circuit breaker opens.
+
+        Raises:
+            scratchattach.exceptions.ConnectionError: The circuit breaker is open
+        """
+        while True:
+            try:
+                self.attempt(reopen)
+                return
+            except exceptions.ConnectionError:
+                if self._opened_at is not None:
+                    raise
+            time.sleep(self.next_delay())
+
+    async def run_async(self, reopen):
+        """
+        Like :meth:`run`, but reopen is a coroutine function and the delays don't block the event loop.
+        """
+        while True:
+            self._before_attempt()
+            try:
+                await reopen()
+            except Exception as e:
+                self._failed()
+                if self._opened_at is not None:
+                    raise exceptions.ConnectionError("Reconnecting to the cloud server failed.", str(e))
+                await asyncio.sleep(self.next_delay())
+                continue
+            self._succeeded()
+            return
+
+    def stats(self):
+        """
+        Returns:
+            dict: The state of the circuit breaker and the reconnect counters
+        """
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "reconnects": self.reconnects,
+            "failed_attempts": self.failed_attempts,
+        }
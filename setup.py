@@ -15,8 +15,9 @@ setup(
     description=DESCRIPTION,
     long_description_content_type="text/markdown",
     long_description=open('README.md').read(),
-    packages=find_packages(),
+    packages=find_packages(exclude=["benchmarks", "benchmarks.*"]),
     install_requires=["websocket-client","numpy","requests","bs4"],
+    extras_require={"async": ["websockets>=13"], "speedups": ["orjson"]},
     keywords=['scratch-php api', 'scratchattach-php', 'scratch-php api python', 'scratch python', 'scratch for python', 'scratch-php', 'scratch-php cloud', 'scratch-php cloud variables', 'scratch-php bot'],
     url='https://github.com/TimMcCool/scratchattach',
     classifiers=[